@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+bench_dump_restore
+----------------------------------
+
+Throughput of `DumpManager.dump_all_tables` and `DumpManager.loads` against real databases.
+
+Every combination of dump format, row count, width, column types and foreign key depth gets its own schema: a chain of
+``fk_depth + 1`` tables, each one referencing the previous, with ``width`` payload columns. SQLite in memory is
+always measured; PostgreSQL is measured as well when ``--postgresql-url`` (or ``$BENCHMARK_POSTGRESQL_URL``) is given.
+
+Usage::
+
+    python benchmarks/bench_dump_restore.py --rows 1000 10000 --widths 4 16 --types int mixed --fk-depths 0 2 \
+        --formats sql columnar
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import io
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy_test_cache import DumpManager  # noqa
+from sqlalchemy_test_cache.columnar import encode_dump, iter_columnar_dump  # noqa
+from sqlalchemy_test_cache.parallel import ParallelDumpManager  # noqa
+
+
+COLUMN_TYPES = {
+    'int': (sa.Integer, lambda row, column: row * column),
+    'float': (sa.Float, lambda row, column: row / (column + 1.0)),
+    'text': (sa.String(64), lambda row, column: 'value {} of column {}'.format(row, column)),
+    'datetime': (sa.DateTime, lambda row, column: datetime.datetime(2017, 1, 1) + datetime.timedelta(seconds=row)),
+    'bool': (sa.Boolean, lambda row, column: bool((row + column) % 2)),
+}
+
+SCHEMA_TYPES = {
+    'int': ['int'],
+    'text': ['text'],
+    'mixed': ['int', 'float', 'text', 'datetime', 'bool'],
+}
+
+
+class BaseModel(object):
+    """
+    The `DumpManager` only needs ``base_model.metadata``.
+    """
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+def build_schema(width, schema_type, fk_depth):
+
+    metadata = sa.MetaData()
+    column_types = SCHEMA_TYPES[schema_type]
+
+    for depth in range(fk_depth + 1):
+
+        columns = [sa.Column('id', sa.Integer, primary_key=True, autoincrement=False)]
+
+        if depth:
+            columns.append(sa.Column('parent_id', sa.Integer, sa.ForeignKey('bench_{}.id'.format(depth - 1))))
+
+        for index in range(width):
+            type_ = COLUMN_TYPES[column_types[index % len(column_types)]][0]
+            columns.append(sa.Column('column_{}'.format(index), type_))
+
+        sa.Table('bench_{}'.format(depth), metadata, *columns)
+
+    return metadata
+
+
+def populate(connection, metadata, rows, schema_type):
+
+    column_types = SCHEMA_TYPES[schema_type]
+
+    for table in metadata.sorted_tables:
+
+        values = []
+
+        for row in range(1, rows + 1):
+
+            value = {'id': row}
+
+            if 'parent_id' in table.columns:
+                value['parent_id'] = row
+
+            for index in range(len(table.columns) - len(value)):
+                value['column_{}'.format(index)] = COLUMN_TYPES[column_types[index % len(column_types)]][1](row, index)
+
+            values.append(value)
+
+        connection.execute(table.insert(), values)
+
+
+def clear(dbsession, metadata):
+
+    for table in reversed(metadata.sorted_tables):
+        dbsession.execute(table.delete())
+
+    dbsession.flush()
+
+
+def measure(function):
+
+    tracemalloc.start()
+
+    try:
+        started = time.time()
+        result = function()
+        elapsed = time.time() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def dump_sql(dm):
+    statements = dm.dump_all_tables()
+    return statements, sum(len(statement.encode('utf-8')) + 1 for statement in statements)
+
+
+def load_sql(dm, statements):
+    dm.loads(statements)
+
+
+def dump_columnar(dm):
+    dump_data = encode_dump(dm.dump_all_tables_columnar())
+    return dump_data, len(dump_data)
+
+
+def load_columnar(dm, dump_data):
+    dm.loads_columnar(iter_columnar_dump(io.BytesIO(dump_data)))
+
+
+# Dump format: (function returning the dump and its size, function restoring the dump).
+FORMATS = {
+    'sql': (dump_sql, load_sql),
+    'columnar': (dump_columnar, load_columnar),
+}
+
+
+def run(engine, dump_format, rows, width, schema_type, fk_depth, render_processes=None):
+
+    metadata = build_schema(width, schema_type, fk_depth)
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    try:
+        with engine.begin() as connection:
+            populate(connection, metadata, rows, schema_type)
+
+        dbsession = Session(bind=engine)
+
+        try:
+            if render_processes:
+                dm = ParallelDumpManager(BaseModel(metadata), dbsession, processes=render_processes)
+            else:
+                dm = DumpManager(BaseModel(metadata), dbsession)
+
+            dump, load = FORMATS[dump_format]
+
+            (dump_data, size), dump_time, dump_peak = measure(lambda: dump(dm))
+
+            clear(dbsession, metadata)
+
+            _, restore_time, restore_peak = measure(lambda: load(dm, dump_data))
+
+            total_rows = rows * len(metadata.sorted_tables)
+            restored_rows = sum(dbsession.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+                                for table in metadata.sorted_tables)
+
+            assert restored_rows == total_rows, 'restored {} of {} rows'.format(restored_rows, total_rows)
+        finally:
+            dbsession.rollback()
+            dbsession.close()
+    finally:
+        metadata.drop_all(engine)
+
+    return {
+        'dialect': engine.dialect.name,
+        'format': dump_format,
+        'rows': total_rows,
+        'width': width,
+        'types': schema_type,
+        'fk_depth': fk_depth,
+        'bytes': size,
+        'dump_rows_per_sec': total_rows / dump_time if dump_time else float('inf'),
+        'dump_peak': dump_peak,
+        'restore_rows_per_sec': total_rows / restore_time if restore_time else float('inf'),
+        'restore_peak': restore_peak,
+    }
+
+
+HEADER = '{:<10} {:<8} {:>8} {:>5} {:>6} {:>3} {:>11} {:>12} {:>10} {:>12} {:>10}'
+ROW = '{dialect:<10} {format:<8} {rows:>8} {width:>5} {types:>6} {fk_depth:>3} {bytes:>11} {dump_rows_per_sec:>12.0f} ' \
+      '{dump_peak:>10} {restore_rows_per_sec:>12.0f} {restore_peak:>10}'
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmark the dump and restore throughput.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000], help='rows per table')
+    parser.add_argument('--widths', type=int, nargs='+', default=[4, 16], help='payload columns per table')
+    parser.add_argument('--types', nargs='+', default=['int', 'mixed'], choices=sorted(SCHEMA_TYPES))
+    parser.add_argument('--fk-depths', type=int, nargs='+', default=[0, 2], help='tables chained by foreign keys')
+    parser.add_argument('--formats', nargs='+', default=['sql'], choices=sorted(FORMATS))
+    parser.add_argument('--render-processes', type=int, help='render the SQL dumps in a pool of processes')
+    parser.add_argument('--postgresql-url', default=os.environ.get('BENCHMARK_POSTGRESQL_URL'))
+    args = parser.parse_args(argv)
+
+    engines = [sa.create_engine('sqlite://')]
+
+    if args.postgresql_url:
+        engines.append(sa.create_engine(args.postgresql_url))
+
+    print(HEADER.format(
+        'DIALECT', 'FORMAT', 'ROWS', 'WIDTH', 'TYPES', 'FK', 'BYTES', 'DUMP ROW/S', 'DUMP PEAK', 'LOAD ROW/S', 'LOAD PEAK'
+    ))
+
+    for engine, dump_format, rows, width, schema_type, fk_depth in itertools.product(
+            engines, args.formats, args.rows, args.widths, args.types, args.fk_depths):
+        print(ROW.format(**run(engine, dump_format, rows, width, schema_type, fk_depth, args.render_processes)))
+        sys.stdout.flush()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
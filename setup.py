@@ -29,7 +29,11 @@ setup(
     ],
     package_dir={'sqlalchemy_test_cache':
                  'sqlalchemy_test_cache'},
-    entry_points={},
+    entry_points={
+        'console_scripts': [
+            'sqlalchemy-test-cache=sqlalchemy_test_cache.cli:main',
+        ],
+    },
     include_package_data=True,
     install_requires=requirements,
     license="MIT license",
@@ -7,3 +7,10 @@ __all__ = ['DumpManager', 'cache_sql']
 
 from .sqlalchemy_test_cache import DumpManager  # noqa
 from .decorator import cache_sql # noqa
+
+try:
+    from .aio import AsyncDumpManager, async_cache_sql  # noqa
+except (ImportError, SyntaxError):  # python2 or SQLAlchemy without asyncio support
+    pass
+else:
+    __all__ += ['AsyncDumpManager', 'async_cache_sql']
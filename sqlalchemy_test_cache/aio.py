@@ -0,0 +1,184 @@
+"""
+Counterparts of :class:`DumpManager` and :func:`cache_sql` for ``AsyncSession`` (SQLAlchemy 1.4+, Python 3 only).
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+
+from . import decorator
+from .sqlalchemy_test_cache import DumpManager
+from .utils import load_dump_data_from_file, read_dump_metadata
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDumpManager(DumpManager):
+    """
+    Rows are streamed from a server side cursor in partitions of ``fetch_size`` while dumping, and the statements are
+    executed in batches of ``batch_size`` while restoring, the next batch being read from the dump file while the
+    current one is executed.
+    """
+
+    # Drivers which accept many statements in a single ``execute`` without parameters, i.e. a single round trip.
+    SCRIPT_DRIVERS = ('asyncpg',)
+
+    def __init__(self, base_model, dbsession, fetch_size=1000, batch_size=500):
+        super(AsyncDumpManager, self).__init__(base_model, dbsession)
+        self.fetch_size = fetch_size
+        self.batch_size = batch_size
+
+    async def dump(self, table):
+
+        logger.info('Generating dump for the table: {!r}'.format(table.name))
+
+        statements = []
+
+        result = await self.dbsession.stream(self._get_table_select(table))
+
+        async for rows in result.partitions(self.fetch_size):
+            statements.extend(self._build_insert_row(table, row) for row in rows)
+
+        self._update_table_stats(table, statements)
+
+        return statements
+
+    async def dump_all_tables(self):
+
+        logger.info('Starting dump process of {} tables'.format(len(self.tables)))
+
+        statements = []
+
+        for table in self.tables:
+            statements.extend(await self.dump(table))
+
+        return statements
+
+    def _iter_batches(self, content):
+
+        batch = []
+
+        for line in content:
+            line = line.strip()
+            if line:
+                batch.append(line)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    async def _get_batch_executor(self):
+
+        connection = await self.dbsession.connection()
+
+        if connection.dialect.driver not in self.SCRIPT_DRIVERS:
+
+            async def execute(batch):
+                for statement in batch:
+                    await connection.exec_driver_sql(statement)
+
+            return execute
+
+        # The driver starts its transaction on the first statement going through SQLAlchemy, so the scripts sent
+        # straight to the driver connection are not committed on their own.
+        await connection.exec_driver_sql('SELECT 1')
+
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        async def execute_script(batch):
+            await driver_connection.execute('\n'.join(batch))
+
+        return execute_script
+
+    async def loads(self, content):
+
+        loop = asyncio.get_event_loop()
+        batches = self._iter_batches(content)
+        execute = await self._get_batch_executor()
+
+        # Reading the dump file is blocking, so the next batch is read in a thread while the current one is executed.
+        next_batch = loop.run_in_executor(None, next, batches, None)
+
+        while True:
+
+            batch = await next_batch
+
+            if batch is None:
+                break
+
+            next_batch = loop.run_in_executor(None, next, batches, None)
+
+            await execute(batch)
+
+        await self.dbsession.flush()
+
+
+def async_cache_sql(base_model, dbsession, min_speedup=None, delete_slow_dumps=False, share_arguments=False):
+    """
+    :func:`sqlalchemy_test_cache.cache_sql` for coroutine functions using an ``AsyncSession``, e.g. the tests of an
+    ``unittest.IsolatedAsyncioTestCase``.
+    """
+
+    def wrapper(test_function):
+
+        @functools.wraps(test_function)
+        async def _wrapper(self, *args, **kwargs):
+
+            path = decorator._get_dump_path(self, test_function, args, kwargs, share_arguments)
+            test_name = decorator._get_test_name(self, test_function)
+
+            if path is None:
+                logger.warning('The arguments of {!r} have no stable representation, so it is not cached.'.format(
+                    test_name
+                ))
+                return await test_function(self, *args, **kwargs)
+            dm = AsyncDumpManager(base_model, dbsession)
+            metadata = read_dump_metadata(path)
+
+            if metadata.get('disabled'):
+
+                logger.info('Cache of {!r} is disabled as loading the dump does not pay off.'.format(test_name))
+
+                started = time.time()
+                result = await test_function(self, *args, **kwargs)
+                decorator._skip_disabled(path, test_name, metadata, time.time() - started)
+
+                return result
+
+            elif not os.path.exists(path):
+
+                logger.info('Dump file {!r} does not exists. The queries will not be cached.'.format(path))
+
+                started = time.time()
+                result = await test_function(self, *args, **kwargs)
+                test_time = time.time() - started
+
+                started = time.time()
+                statements = await dm.dump_all_tables()
+                decorator._save_dump(path, self, test_function, statements, dm.table_stats, test_time, started)
+
+                return result
+
+            else:
+
+                logger.info('Loading data from cache file: {!r}'.format(path))
+
+                started = time.time()
+                await dm.loads(load_dump_data_from_file(path))
+                decorator._finish_restore(
+                    path, test_name, metadata, time.time() - started, min_speedup, delete_slow_dumps
+                )
+
+                return
+
+        _wrapper.cache_sql = True
+
+        return _wrapper
+
+    return wrapper
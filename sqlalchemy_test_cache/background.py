@@ -0,0 +1,88 @@
+"""
+Writing of the dumps in a background thread.
+
+The rows are fetched by the test, in its transaction, and the dump is rendered and written by :data:`writer` while the
+next tests run. The pending dumps are written before the interpreter exits, and before a dump still pending is looked
+up by the decorator.
+"""
+from __future__ import unicode_literals
+
+import atexit
+import collections
+import logging
+import threading
+try:
+    import queue
+except ImportError:  # python2
+    import Queue as queue
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWriter(object):
+    """
+    Run the writing tasks, one at a time and in order, in a daemon thread started on the first task.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = collections.Counter()
+
+    def _run(self):
+
+        while True:
+
+            path, function, args = self._queue.get()
+
+            try:
+                function(*args)
+            except Exception:
+                logger.exception('Failed to write the dump {!r} in background.'.format(path))
+            finally:
+                with self._lock:
+                    self._pending[path] -= 1
+                self._queue.task_done()
+
+    def _start(self):
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sqlalchemy-test-cache-writer')
+            self._thread.daemon = True
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, path, function, *args):
+        """
+        Write the dump file ``path`` calling ``function(*args)`` in background.
+        """
+
+        with self._lock:
+            self._start()
+            self._pending[path] += 1
+
+        self._queue.put((path, function, args))
+
+    def is_pending(self, path):
+        with self._lock:
+            return self._pending[path] > 0
+
+    def flush(self):
+        """
+        Wait until every submitted dump is written.
+        """
+        self._queue.join()
+
+    def wait(self, *paths):
+        """
+        Flush the pending dumps when any of the dump files is still pending.
+        """
+
+        if any(self.is_pending(path) for path in paths):
+            logger.info('Waiting for the dumps written in background.')
+            self.flush()
+
+
+writer = BackgroundWriter()
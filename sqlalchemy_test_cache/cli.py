@@ -0,0 +1,270 @@
+from __future__ import print_function
+
+import argparse
+import collections
+import glob
+import io
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+
+from .background import writer
+from .columnar import MAGIC as COLUMNAR_MAGIC
+from .storage import generate_chunk_hash, generate_chunk_path, read_manifest
+from .utils import (
+    CACHE_DIR_ENV_VAR, DUMP_FILE_EXTENSION, generate_dump_checksum, generate_metadata_path, get_cache_dir,
+    iter_statements, read_dump_metadata
+)
+
+
+BuildResult = collections.namedtuple('BuildResult', ('test_case', 'tests_run', 'failures'))
+
+
+def iter_tests(suite):
+
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for inner_test in iter_tests(test):
+                yield inner_test
+        else:
+            yield test
+
+
+def is_cached_test_case(test_case_class):
+    return any(getattr(getattr(test_case_class, name, None), 'cache_sql', False) for name in dir(test_case_class))
+
+
+def discover_cached_tests(start_dir, pattern='test*.py', top_level_dir=None):
+    """
+    Return an ordered mapping of test case name to the test ids of every test case which has at least one method
+    decorated with :func:`sqlalchemy_test_cache.cache_sql`.
+    """
+
+    suite = unittest.TestLoader().discover(start_dir, pattern=pattern, top_level_dir=top_level_dir)
+
+    groups = collections.OrderedDict()
+
+    for test in iter_tests(suite):
+        test_case_class = test.__class__
+        if is_cached_test_case(test_case_class):
+            name = '{}.{}'.format(test_case_class.__module__, test_case_class.__name__)
+            groups.setdefault(name, []).append(test.id())
+
+    return groups
+
+
+def _build_test_case(args):
+
+    test_case, test_ids, top_level_dir = args
+
+    if top_level_dir and top_level_dir not in sys.path:
+        sys.path.insert(0, top_level_dir)
+
+    suite = unittest.TestLoader().loadTestsFromNames(test_ids)
+
+    with open(os.devnull, 'w') as devnull:
+        result = unittest.TextTestRunner(stream=devnull, verbosity=0).run(suite)
+
+    # The pool workers do not run the exit handlers, which write the dumps still pending.
+    writer.flush()
+
+    return BuildResult(test_case, result.testsRun, len(result.failures) + len(result.errors))
+
+
+def build(start_dir, pattern='test*.py', top_level_dir=None, jobs=None, stream=sys.stdout):
+    """
+    Run every cached test case, spreading them among ``jobs`` processes, so their dumps are written to the cache
+    directory before the real test run.
+    """
+
+    top_level_dir = os.path.abspath(top_level_dir or start_dir)
+    groups = discover_cached_tests(start_dir, pattern=pattern, top_level_dir=top_level_dir)
+
+    if not groups:
+        print('No cached test cases were found in {!r}.'.format(start_dir), file=stream)
+        return 0
+
+    tasks = [(test_case, test_ids, top_level_dir) for test_case, test_ids in groups.items()]
+
+    pool = multiprocessing.Pool(processes=min(jobs or multiprocessing.cpu_count(), len(tasks)))
+
+    try:
+        results = list(pool.imap_unordered(_build_test_case, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    failed = 0
+
+    for result in sorted(results):
+        status = 'FAILED' if result.failures else 'OK'
+        failed += bool(result.failures)
+        print('{} {} ({} tests)'.format(status, result.test_case, result.tests_run), file=stream)
+
+    return 1 if failed else 0
+
+
+def iter_cache_entries(cache_dir):
+    return sorted(glob.glob(os.path.join(cache_dir, '*{}'.format(DUMP_FILE_EXTENSION))))
+
+
+def format_size(size):
+
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '{:.0f}{}'.format(size, unit)
+        size /= 1024.0
+
+    return '{:.1f}GB'.format(size)
+
+
+def format_age(seconds):
+
+    for unit, length in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= length:
+            return '{}{}'.format(int(seconds // length), unit)
+
+    return '{}s'.format(int(seconds))
+
+
+def list_entries(cache_dir, stream=sys.stdout):
+
+    now = time.time()
+
+    print('{:<60} {:>8} {:>6} {:>6}'.format('ENTRY', 'SIZE', 'AGE', 'HITS'), file=stream)
+
+    for path in iter_cache_entries(cache_dir):
+        metadata = read_dump_metadata(path)
+        print('{:<60} {:>8} {:>6} {:>6}'.format(
+            os.path.basename(path),
+            format_size(os.path.getsize(path)),
+            format_age(now - metadata.get('created', os.path.getmtime(path))),
+            metadata.get('hits', '-'),
+        ), file=stream)
+
+    return 0
+
+
+def verify_entry(path):
+    """
+    Return the reason why the dump file is not usable, or ``None`` when it is.
+    """
+
+    metadata = read_dump_metadata(path)
+
+    if not metadata:
+        return 'missing metadata'
+
+    with open(path, 'rb') as f:
+        dump_data = f.read()
+
+    if generate_dump_checksum(dump_data) != metadata.get('checksum'):
+        return 'checksum mismatch'
+
+    if metadata.get('format') == 'chunked':
+        return verify_chunks(path)
+
+    if metadata.get('format') == 'columnar':
+        return None if dump_data.startswith(COLUMNAR_MAGIC) else 'not a columnar dump'
+
+    dump_data = dump_data.decode('utf-8')
+
+    for statement in iter_statements(io.StringIO(dump_data)):
+        if not statement.startswith('INSERT INTO '):
+            return 'unexpected statement {!r}'.format(statement[:40])
+
+    return None
+
+
+def verify_chunks(path):
+
+    for table, chunk_hash in read_manifest(path)['chunks']:
+
+        chunk_path = generate_chunk_path(chunk_hash, os.path.dirname(path))
+
+        if not os.path.exists(chunk_path):
+            return 'missing chunk of {!r}'.format(table)
+
+        with open(chunk_path) as f:
+            if generate_chunk_hash(f.read()) != chunk_hash:
+                return 'corrupted chunk of {!r}'.format(table)
+
+    return None
+
+
+def verify(cache_dir, delete=False, stream=sys.stdout):
+
+    invalid = 0
+
+    for path in iter_cache_entries(cache_dir):
+
+        reason = verify_entry(path)
+
+        if reason is None:
+            print('OK {}'.format(os.path.basename(path)), file=stream)
+            continue
+
+        invalid += 1
+        print('INVALID {} ({})'.format(os.path.basename(path), reason), file=stream)
+
+        if delete:
+            for _path in (path, generate_metadata_path(path)):
+                if os.path.exists(_path):
+                    os.unlink(_path)
+
+    return 1 if invalid else 0
+
+
+def get_parser():
+
+    parser = argparse.ArgumentParser(
+        prog='sqlalchemy-test-cache', description='Build, inspect and verify the sqlalchemy-test-cache dumps.'
+    )
+    parser.add_argument(
+        '--cache-dir', help='directory of the dump files (default: ${} or the temporary directory)'.format(
+            CACHE_DIR_ENV_VAR
+        )
+    )
+
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    build_parser = subparsers.add_parser('build', help='run the cached test cases in order to write their dumps')
+    build_parser.add_argument('start_dir', nargs='?', default='.', help='directory to start the test discovery')
+    build_parser.add_argument('-p', '--pattern', default='test*.py', help='pattern to match test files')
+    build_parser.add_argument('-t', '--top-level-directory', dest='top_level_dir', help='top level directory of project')
+    build_parser.add_argument('-j', '--jobs', type=int, help='number of processes (default: number of CPUs)')
+
+    subparsers.add_parser('list', help='list the dump files with their sizes, ages and hit counts')
+
+    verify_parser = subparsers.add_parser('verify', help='check the dump files against their metadata')
+    verify_parser.add_argument('--delete', action='store_true', help='delete the invalid dump files')
+
+    return parser
+
+
+def main(argv=None):
+
+    args = get_parser().parse_args(argv)
+
+    if args.cache_dir:
+        # Exported so the test processes started by ``build`` write their dumps in the same directory.
+        os.environ[CACHE_DIR_ENV_VAR] = args.cache_dir
+
+        if not os.path.isdir(args.cache_dir):
+            os.makedirs(args.cache_dir)
+
+    cache_dir = get_cache_dir()
+
+    if args.command == 'build':
+        return build(args.start_dir, pattern=args.pattern, top_level_dir=args.top_level_dir, jobs=args.jobs)
+    elif args.command == 'list':
+        return list_entries(cache_dir)
+
+    return verify(cache_dir, delete=args.delete)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Columnar format of the dumps.
+
+The rows of each table are stored column by column, each column with an encoding chosen from its values: integers,
+floats, booleans, dates and naive datetimes are packed as fixed size binary arrays in a single ``struct`` call, text
+and binary values as their lengths followed by their concatenated bytes, and anything else is pickled. The ``None``
+values are kept in a bitmap aside, so the arrays hold no markers.
+
+The file starts with :data:`MAGIC`, followed by a block per table: the length of its JSON header, the header (table
+name, number of rows and the encoding and sizes of each column) and the buffers of its columns. A table is restored by
+decoding its columns and executing the insert of the table with the rows as parameters, without any SQL rendering.
+"""
+from __future__ import unicode_literals
+
+import datetime
+import json
+import pickle
+import struct
+
+
+MAGIC = b'SQLTC-COLUMNAR-1\n'
+
+HEADER_LENGTH_FORMAT = '<I'
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+try:
+    text_type, integer_types = unicode, (int, long)
+except NameError:
+    text_type, integer_types = str, (int,)
+
+
+def _pack(fmt, values):
+    return struct.pack('<{}{}'.format(len(values), fmt), *values)
+
+
+def _unpack(fmt, data):
+    return struct.unpack('<{}{}'.format(len(data) // struct.calcsize(fmt), fmt), data)
+
+
+def _is_int64(value):
+    return isinstance(value, integer_types) and not isinstance(value, bool) and INT64_MIN <= value <= INT64_MAX
+
+
+def _is_naive_datetime(value):
+    return isinstance(value, datetime.datetime) and value.tzinfo is None
+
+
+def _is_date(value):
+    return isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+
+
+def _to_microseconds(value):
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _encode_sized(values):
+    return _pack('I', [len(value) for value in values]) + b''.join(values)
+
+
+def _decode_sized(data, rows):
+
+    lengths = _unpack('I', data[:rows * 4])
+    values, offset = [], rows * 4
+
+    for length in lengths:
+        values.append(data[offset:offset + length])
+        offset += length
+
+    return values
+
+
+# Encoding name: (predicate of the values, encoder of the values, decoder of the buffer given the number of rows).
+# The ``None`` values are replaced by a placeholder before encoding and restored from the nulls bitmap after decoding.
+ENCODINGS = (
+    ('bool', lambda v: isinstance(v, bool),
+     lambda values: bytes(bytearray(values)),
+     lambda data, rows: [bool(value) for value in bytearray(data)]),
+    ('int64', _is_int64,
+     lambda values: _pack('q', values),
+     lambda data, rows: list(_unpack('q', data))),
+    ('float64', lambda v: isinstance(v, float),
+     lambda values: _pack('d', values),
+     lambda data, rows: list(_unpack('d', data))),
+    ('datetime', _is_naive_datetime,
+     lambda values: _pack('q', [_to_microseconds(value) for value in values]),
+     lambda data, rows: [EPOCH + datetime.timedelta(microseconds=value) for value in _unpack('q', data)]),
+    ('date', _is_date,
+     lambda values: _pack('i', [value.toordinal() for value in values]),
+     lambda data, rows: [datetime.date.fromordinal(value) for value in _unpack('i', data)]),
+    ('text', lambda v: isinstance(v, text_type),
+     lambda values: _encode_sized([value.encode('utf-8') for value in values]),
+     lambda data, rows: [value.decode('utf-8') for value in _decode_sized(data, rows)]),
+    ('bytes', lambda v: isinstance(v, bytes),
+     _encode_sized,
+     _decode_sized),
+)
+
+PLACEHOLDERS = {
+    'bool': False, 'int64': 0, 'float64': 0.0, 'datetime': EPOCH, 'date': EPOCH.date(), 'text': '', 'bytes': b'',
+}
+
+ENCODERS = {name: encoder for name, _, encoder, _ in ENCODINGS}
+DECODERS = {name: decoder for name, _, _, decoder in ENCODINGS}
+ENCODERS['pickle'] = lambda values: pickle.dumps(values, 2)
+DECODERS['pickle'] = lambda data, rows: pickle.loads(data)
+
+
+def get_encoding(values):
+    """
+    Return the name of the most compact encoding of the values, ``'pickle'`` when no specialized one fits them all.
+    """
+
+    non_null = [value for value in values if value is not None]
+
+    for name, predicate, _, _ in ENCODINGS:
+        if all(predicate(value) for value in non_null):
+            return name
+
+    return 'pickle'
+
+
+def encode_nulls(values):
+
+    if all(value is not None for value in values):
+        return b''
+
+    bitmap = bytearray((len(values) + 7) // 8)
+
+    for i, value in enumerate(values):
+        if value is None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+
+    return bytes(bitmap)
+
+
+def decode_nulls(bitmap, values):
+
+    if not bitmap:
+        return values
+
+    bitmap = bytearray(bitmap)
+
+    return [None if bitmap[i >> 3] & (1 << (i & 7)) else value for i, value in enumerate(values)]
+
+
+def encode_column(values):
+    """
+    Return the encoding, the nulls bitmap and the buffer of the column values.
+    """
+
+    encoding = get_encoding(values)
+
+    if encoding != 'pickle':
+        placeholder = PLACEHOLDERS[encoding]
+        return encoding, encode_nulls(values), ENCODERS[encoding]([
+            placeholder if value is None else value for value in values
+        ])
+
+    return encoding, b'', ENCODERS[encoding](list(values))
+
+
+def decode_column(encoding, rows, nulls, data):
+    return decode_nulls(nulls, DECODERS[encoding](data, rows))
+
+
+def encode_table(table_name, column_names, rows):
+    """
+    Return the block of the table with the given rows, each one a sequence of values in the order of ``column_names``.
+    """
+
+    rows = list(rows)
+    columns = list(zip(*rows)) if rows else [() for _ in column_names]
+
+    header = {'table': table_name, 'rows': len(rows), 'columns': []}
+    buffers = []
+
+    for name, values in zip(column_names, columns):
+        encoding, nulls, data = encode_column(list(values))
+        header['columns'].append({'name': name, 'encoding': encoding, 'nulls': len(nulls), 'size': len(data)})
+        buffers.extend((nulls, data))
+
+    header_data = json.dumps(header, sort_keys=True).encode('utf-8')
+
+    return struct.pack(HEADER_LENGTH_FORMAT, len(header_data)) + header_data + b''.join(buffers)
+
+
+def encode_dump(blocks):
+    return MAGIC + b''.join(blocks)
+
+
+def _read_header(f):
+
+    length_data = f.read(struct.calcsize(HEADER_LENGTH_FORMAT))
+
+    if not length_data:
+        return None
+
+    length, = struct.unpack(HEADER_LENGTH_FORMAT, length_data)
+
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def iter_columnar_dump(f, tables=None):
+    """
+    Yield the table name, the column names and the rows of each table in the file object, skipping the buffers of the
+    tables not in ``tables`` when given.
+    """
+
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a columnar dump.')
+
+    while True:
+
+        header = _read_header(f)
+
+        if header is None:
+            break
+
+        if tables is not None and header['table'] not in tables:
+            f.seek(sum(column['nulls'] + column['size'] for column in header['columns']), 1)
+            continue
+
+        columns = [
+            decode_column(column['encoding'], header['rows'], f.read(column['nulls']), f.read(column['size']))
+            for column in header['columns']
+        ]
+
+        rows = list(zip(*columns)) if columns else [() for _ in range(header['rows'])]
+
+        yield header['table'], [column['name'] for column in header['columns']], rows
+
+
+def load_columnar_dump(dump_file_path, tables=None):
+
+    with open(dump_file_path, 'rb') as f:
+        for table_data in iter_columnar_dump(f, tables):
+            yield table_data
+
+
+def write_columnar_dump(dump_file_path, dump_data):
+    with open(dump_file_path, 'wb') as f:
+        f.write(dump_data)
@@ -1,31 +1,608 @@
+import collections
 import functools
 import logging
 import os
+import time
+import unittest
 
+from . import metrics
+from .background import writer
+from .columnar import encode_dump, load_columnar_dump, write_columnar_dump
+from .parallel import ParallelDumpManager
+from .rehydration import record_instances, rehydrate_instances
 from .sqlalchemy_test_cache import DumpManager
-from .utils import generate_dump_path, load_dump_data_from_file, write_dump_data_to_file
+from .storage import load_chunked_dump, write_chunked_dump
+from .tracking import TableAccessRecorder
+from .translation import DialectTranslationError
+from .tuning import RestoreTuning, analyze_tables
+from .utils import (
+    generate_arguments_key, generate_dump_checksum, generate_dump_path, generate_layer_path, generate_test_key,
+    load_dump_data_from_file, read_dump_metadata, write_dump_data_to_file, write_dump_metadata
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-def cache_sql(base_model, dbsession):
+def _get_test_name(test_case, test_function):
+    return '{}.{}.{}'.format(test_case.__class__.__module__, test_case.__class__.__name__, test_function.__name__)
+
+
+def _get_dump_path(test_case, test_function, args=(), kwargs=None, share_arguments=False):
+    """
+    Return the path of the dump of the call of the method with the arguments, or ``None`` when the arguments have no
+    stable key. The calls with any arguments share the same dump with ``share_arguments``.
+    """
+
+    arguments_key = None
+
+    if not share_arguments and (args or kwargs):
+
+        arguments_key = generate_arguments_key(args, kwargs or {})
+
+        if arguments_key is None:
+            return None
+
+    test_case_class, function_name = test_case.__class__, test_function.__name__
+
+    return generate_dump_path(
+        '{}.{}'.format(test_case_class.__name__, function_name),
+        generate_test_key(test_case_class, function_name, arguments_key)
+    )
+
+
+def _record_hit(path, metadata, restore_time):
+
+    if metadata:
+        metadata['hits'] = metadata.get('hits', 0) + 1
+        metadata['last_hit'] = time.time()
+        metadata['restore_time'] = restore_time
+        write_dump_metadata(path, metadata)
+
+    return metadata
+
+
+def _pays_off(metadata, min_speedup):
+
+    test_time, restore_time = metadata.get('test_time'), metadata.get('restore_time')
+
+    if not min_speedup or test_time is None or restore_time is None:
+        return True
+
+    return test_time >= restore_time * min_speedup
+
+
+def _disable(path, metadata, delete_dump):
+
+    metadata['disabled'] = True
+    write_dump_metadata(path, metadata)
+
+    if delete_dump and os.path.exists(path):
+        os.unlink(path)
+
+
+SQL_FORMAT = 'sql'
+CHUNKED_FORMAT = 'chunked'
+COLUMNAR_FORMAT = 'columnar'
+
+DUMP_FORMATS = (SQL_FORMAT, COLUMNAR_FORMAT)
+
+
+def _read_dump(path, metadata, tables=None):
+
+    if metadata.get('format') == CHUNKED_FORMAT:
+        return load_chunked_dump(path, tables=tables)
+
+    return load_dump_data_from_file(path)
+
+
+def _write_dump(path, statements, dump_format):
+    """
+    Write the dump file in the format, returning its content. The statements are the blocks of the tables in the
+    columnar format.
+    """
+
+    if dump_format == CHUNKED_FORMAT:
+        return write_chunked_dump(path, statements)
+
+    if dump_format == COLUMNAR_FORMAT:
+        dump_data = encode_dump(statements)
+        write_columnar_dump(path, dump_data)
+        return dump_data
+
+    dump_data = '\n'.join(statements)
+    write_dump_data_to_file(path, dump_data)
+
+    return dump_data
+
+
+def _save_dump(path, test_case, test_function, statements, table_stats, test_time, dump_started, dump_format=SQL_FORMAT,
+               **extra_metadata):
+
+    test_name = _get_test_name(test_case, test_function)
+
+    dump_data = _write_dump(path, statements, dump_format)
+
+    if dump_format != SQL_FORMAT:
+        extra_metadata['format'] = dump_format
+
+    dump_time = time.time() - dump_started
+
+    metadata = {
+        'test_case': '{}.{}'.format(test_case.__class__.__module__, test_case.__class__.__name__),
+        'function': test_function.__name__,
+        'created': time.time(),
+        'statements': sum(stats['rows'] for stats in table_stats.values()) if dump_format == COLUMNAR_FORMAT
+        else len(statements),
+        'checksum': generate_dump_checksum(dump_data),
+        'hits': 0,
+        'test_time': test_time,
+        'dump_time': dump_time,
+        'tables': table_stats,
+    }
+    metadata.update(extra_metadata)
+
+    write_dump_metadata(path, metadata)
+
+    logger.info('Dump of {!r} written in {:.3f}s (test took {:.3f}s).'.format(test_name, dump_time, test_time))
+
+    metrics.emit(metrics.CacheEvent(test_name, path, False, test_time, dump_time, None, table_stats))
+
+
+def _skip_disabled(path, test_name, metadata, test_time):
+    metrics.emit(metrics.CacheEvent(test_name, path, False, test_time, None, None, metadata.get('tables')))
+
+
+def _finish_restore(path, test_name, metadata, restore_time, min_speedup, delete_slow_dumps):
+
+    _record_hit(path, metadata, restore_time)
+
+    logger.info('Dump of {!r} restored in {:.3f}s.'.format(test_name, restore_time))
+
+    if not _pays_off(metadata, min_speedup):
+        logger.warning(
+            'Loading the dump of {!r} is not {}x faster than running it ({:.3f}s against {:.3f}s), '
+            'its cache is disabled.'.format(test_name, min_speedup, restore_time, metadata['test_time'])
+        )
+        _disable(path, metadata, delete_slow_dumps)
+
+    metrics.emit(metrics.CacheEvent(
+        test_name, path, True, metadata.get('test_time'), None, restore_time, metadata.get('tables', {})
+    ))
+
+
+# The statements of each layer read in this process, by layer name, along with the layer checksum.
+_layers = {}
+
+
+def _get_layer_statements(layer_name):
+
+    path = generate_layer_path(layer_name)
+    metadata = read_dump_metadata(path)
+    checksum = metadata.get('checksum')
+
+    if layer_name not in _layers or _layers[layer_name][0] != checksum:
+        statements = [line.strip() for line in _read_dump(path, metadata) if line.strip()]
+        _layers[layer_name] = (checksum, statements)
+
+    return _layers[layer_name][1]
+
+
+def _is_base_layer_valid(metadata):
+
+    base_layer = metadata.get('base_layer')
+
+    if base_layer is None:
+        return True
+
+    layer_path = generate_layer_path(base_layer)
+
+    return os.path.exists(layer_path) and read_dump_metadata(layer_path).get('checksum') == metadata.get('base_checksum')
+
+
+def _split_base_layer(statements, base_layer):
+    """
+    Return the statements which are not in the base layer, or ``None`` when some rows of the base layer are missing,
+    i.e. they were changed or deleted and the dump can not be stored as a delta.
+    """
+
+    remaining = collections.Counter(_get_layer_statements(base_layer))
+    delta = []
+
+    for statement in statements:
+        if remaining[statement]:
+            remaining[statement] -= 1
+        else:
+            delta.append(statement)
+
+    if any(remaining.values()):
+        return None
+
+    return delta
+
+
+def _dump_all_tables(dm, path, base_layer, dump_format=SQL_FORMAT):
+    """
+    Return the statements to be saved in the dump file along with the extra metadata of the dump.
+    """
+
+    if dump_format == COLUMNAR_FORMAT:
+        return dm.dump_all_tables_columnar(), {}
+
+    statements = dm.dump_all_tables()
+
+    if base_layer is None:
+        return statements, {}
+
+    if not os.path.exists(generate_layer_path(base_layer)):
+        logger.warning('The base layer {!r} does not exist, so {!r} is a full dump.'.format(base_layer, path))
+        return statements, {}
+
+    delta = _split_base_layer(statements, base_layer)
+
+    if delta is None:
+        logger.warning('Rows of the base layer {!r} were changed, so {!r} is a full dump.'.format(base_layer, path))
+        return statements, {}
+
+    return delta, {
+        'base_layer': base_layer,
+        'base_checksum': read_dump_metadata(generate_layer_path(base_layer)).get('checksum'),
+    }
+
+
+def _run_test(test_case, test_function, args, kwargs, dm, dbsession, record_access):
+    """
+    Run the test function, returning its result, how long it took and the tables it accessed, when recorded.
+    """
+
+    started = time.time()
+
+    if not record_access:
+        return test_function(test_case, *args, **kwargs), time.time() - started, None
+
+    with TableAccessRecorder(dm.tables, *dm.get_binds()) as recorder:
+        result = test_function(test_case, *args, **kwargs)
+
+    return result, time.time() - started, sorted(recorder.accessed_tables)
+
+
+def _get_extra_metadata(test_case, dbsession, accessed_tables, rehydrate):
+    """
+    Return the metadata of the dump about the function run: the tables it accessed and the mapped objects it stored on
+    the test case, when recorded.
+    """
+
+    extra_metadata = {}
+
+    if accessed_tables is not None:
+        extra_metadata['accessed_tables'] = accessed_tables
+
+    if rehydrate:
+        # The identities of the new objects are known once they are flushed.
+        dbsession.flush()
+        extra_metadata['instances'] = record_instances(test_case)
+
+    return extra_metadata
+
+
+def _get_tables_to_restore(dm, metadata, only_accessed_tables):
+    """
+    Return the tables accessed by the function along with their foreign key ancestors, or ``None`` for all of them.
+    """
+
+    if not only_accessed_tables or metadata.get('accessed_tables') is None:
+        return None
+
+    return dm.get_required_tables(metadata['accessed_tables'])
+
+
+def _dump_and_save(dm, path, test_case, test_function, test_time, base_layer, dump_format, extra_metadata):
+
+    started = time.time()
+
+    statements, dump_metadata = _dump_all_tables(dm, path, base_layer, dump_format)
+    dump_metadata.update(extra_metadata, dialect=dm.get_dialect_name())
+
+    _save_dump(
+        path, test_case, test_function, statements, dm.table_stats, test_time, started, dump_format=dump_format,
+        **dump_metadata
+    )
+
+
+def _create_dump_manager(base_model, dbsession, render_processes, subset=None):
+
+    kwargs = {'subset': subset} if subset else {}
+
+    if not render_processes:
+        return DumpManager(base_model, dbsession, **kwargs)
+
+    return ParallelDumpManager(
+        base_model, dbsession, processes=None if render_processes is True else render_processes, **kwargs
+    )
+
+
+def _wait_pending_dumps(path, base_layer):
+    """
+    Wait for the dump, or its base layer, when it is still being written in background.
+    """
+
+    writer.wait(*([path] if base_layer is None else [path, generate_layer_path(base_layer)]))
+
+
+def _load_dump_data(dm, path, metadata, tables=None):
+
+    dialect_name = dm.get_dialect_name()
+    translate = metadata.get('dialect', dialect_name) != dialect_name
+
+    if metadata.get('format') == COLUMNAR_FORMAT:
+        dm.loads_columnar(load_columnar_dump(path, tables), translate=translate)
+        return
+
+    if translate:
+        raise DialectTranslationError(
+            'The dump {!r} holds SQL statements of {}, which can not be restored on {}. Only the dumps in the {!r} '
+            'format are restored on other dialects.'.format(path, metadata['dialect'], dialect_name, COLUMNAR_FORMAT)
+        )
+
+    loads = dm.loads if tables is None else functools.partial(dm.loads, tables=tables)
+
+    if metadata.get('base_layer'):
+        loads(_get_layer_statements(metadata['base_layer']))
+
+    loads(_read_dump(path, metadata, tables))
+
+
+def _get_restored_tables(metadata, tables=None):
+    return sorted(
+        name for name, stats in metadata.get('tables', {}).items()
+        if stats.get('rows') and (tables is None or name in tables)
+    )
+
+
+def _load_dump(dm, path, metadata, tables=None, reset=False, tuning=None, analyze=False):
+
+    if reset:
+        dm.reset()
+
+    if tuning:
+        with RestoreTuning(dm.dbsession, tuning):
+            _load_dump_data(dm, path, metadata, tables)
+    else:
+        _load_dump_data(dm, path, metadata, tables)
+
+    if analyze:
+        analyze_tables(dm.dbsession, _get_restored_tables(metadata, tables))
+
+
+RESTORE_SCOPES = ('class', 'module')
+
+# The (scope, dump path) restored in the outer transaction of each session.
+_restored_scopes = {}
+
+
+def _get_scope(test_case, restore_scope):
+
+    if restore_scope == 'class':
+        return '{}.{}'.format(test_case.__class__.__module__, test_case.__class__.__name__)
+
+    return test_case.__class__.__module__
+
+
+def _release_scope(dbsession):
+
+    if _restored_scopes.pop(dbsession, None) is not None:
+        dbsession.rollback()
+
+
+def _register_scope_cleanup(test_case, restore_scope, dbsession):
+
+    if restore_scope == 'class':
+        add_cleanup = getattr(test_case.__class__, 'addClassCleanup', None)
+    else:
+        add_cleanup = getattr(unittest, 'addModuleCleanup', None)
+
+    # Before python 3.8 the scope is released when the next one is restored.
+    if add_cleanup is not None:
+        add_cleanup(_release_scope, dbsession)
+
+
+def _rollback_savepoint(savepoint, dbsession):
+
+    if savepoint.is_active:
+        savepoint.rollback()
+    else:
+        # The test ended the outer transaction as well, so the dump must be restored again by the next test.
+        _restored_scopes.pop(dbsession, None)
+
+
+def _switch_scope(test_case, dbsession, path, restore_scope):
+    """
+    Release the scope restored in the outer transaction of the session when it is not the one of the test, returning
+    whether the dump of the test is already there.
+    """
+
+    if _restored_scopes.get(dbsession) == (_get_scope(test_case, restore_scope), path):
+        return True
+
+    _release_scope(dbsession)
+
+    return False
+
+
+def _enter_scope(test_case, dbsession, path, restore_scope):
+    """
+    Keep the rows of the dump in the outer transaction until the end of the scope, running the test in a SAVEPOINT
+    rolled back by its cleanup.
+    """
+
+    scope = (_get_scope(test_case, restore_scope), path)
+
+    if _restored_scopes.get(dbsession) != scope:
+        _restored_scopes[dbsession] = scope
+        _register_scope_cleanup(test_case, restore_scope, dbsession)
+
+    savepoint = dbsession.begin_nested()
+    test_case.addCleanup(_rollback_savepoint, savepoint, dbsession)
+
+
+def _restore(test_case, dm, dbsession, path, metadata, restore_scope, **load_options):
+
+    if restore_scope is None:
+        _load_dump(dm, path, metadata, **load_options)
+        return
+
+    if not _switch_scope(test_case, dbsession, path, restore_scope):
+        _load_dump(dm, path, metadata, **load_options)
+    else:
+        logger.info('Dump file {!r} is already restored.'.format(path))
+
+    _enter_scope(test_case, dbsession, path, restore_scope)
+
+
+def _get_dump_format(restore_scope, layer, base_layer, deduplicate, dump_format):
+    """
+    Check the options of :func:`cache_sql`, returning the format of the dumps written.
+    """
+
+    if layer is not None and base_layer is not None:
+        raise ValueError('The parameters {!r} and {!r} can not be used together.'.format('layer', 'base_layer'))
+
+    if dump_format not in DUMP_FORMATS:
+        raise ValueError('The parameter {!r} must be one of {!r}, not {!r}.'.format(
+            'dump_format', DUMP_FORMATS, dump_format
+        ))
+
+    if dump_format == COLUMNAR_FORMAT and (deduplicate or layer is not None or base_layer is not None):
+        raise ValueError('The {!r} format can not be used along with deduplicate, layer or base_layer.'.format(
+            dump_format
+        ))
+
+    if restore_scope is not None and restore_scope not in RESTORE_SCOPES:
+        raise ValueError('The parameter {!r} must be one of {!r}, not {!r}.'.format(
+            'restore_scope', RESTORE_SCOPES, restore_scope
+        ))
+
+    return CHUNKED_FORMAT if deduplicate else dump_format
+
+
+def cache_sql(base_model, dbsession, min_speedup=None, delete_slow_dumps=False, restore_scope=None, layer=None,
+              base_layer=None, deduplicate=False, only_accessed_tables=False, dump_format=SQL_FORMAT, background=False,
+              render_processes=None, rehydrate=False, share_arguments=False, reset=False, tuning=None, analyze=False,
+              subset=None):
+    """
+    Cache the rows written by the decorated function in a dump file, which is loaded instead of running the function
+    in the next calls.
+
+    When ``min_speedup`` is given, the cache is disabled for the function as soon as loading the dump is not at least
+    ``min_speedup`` times faster than running the function, which then runs normally from that moment on. The
+    disabled dump file is deleted when ``delete_slow_dumps`` is true.
+
+    With ``restore_scope`` as ``'class'`` or ``'module'``, the dump is loaded only once per test case class or module,
+    in the outer transaction of ``dbsession``, and each test runs in a SAVEPOINT rolled back after it. The tests must
+    not commit the session, and ``self`` must be a ``unittest.TestCase``.
+
+    With ``layer``, the dump is a layer shared by every test case under that name, e.g. a big common seed. The dumps
+    of the functions with that ``base_layer`` only keep the rows added on top of the layer, which is restored first.
+    The function must call the layer function itself, so the layer is part of the state it dumps.
+
+    With ``deduplicate``, the rows of each table are stored in a chunk file named after the hash of its content, shared
+    by every dump with the same rows, and the dump is the list of its chunks.
+
+    With ``only_accessed_tables``, the tables referenced by the statements executed while the function runs are saved
+    in the metadata of the dump, and only those tables, along with the ones they refer to through foreign keys, are
+    restored. The test must not rely on the rows of any other table, which it does not query anyway.
+
+    With ``dump_format`` as ``'columnar'``, the rows are stored column by column in a binary format and restored with
+    an ``executemany`` of the insert of each table, instead of SQL statements. It can not be used along with
+    ``deduplicate``, ``layer`` or ``base_layer``, which work on the statements. The columnar dumps are restored on
+    other dialects as well, e.g. captured on PostgreSQL and replayed on SQLite, see
+    :mod:`sqlalchemy_test_cache.translation`.
+
+    With ``background``, only the rows are fetched after the function runs, in its transaction, and the dump is rendered
+    and written in a background thread, see :mod:`sqlalchemy_test_cache.background`.
+
+    With ``render_processes``, the rows are rendered by a pool of processes, ``True`` meaning one per CPU, see
+    :mod:`sqlalchemy_test_cache.parallel`.
+
+    With ``rehydrate``, the attributes of the test case holding mapped objects, or lists of them, after the function
+    runs are saved in the metadata of the dump by primary key, and set back after the dump is restored, loading the
+    objects of each class by a single query. It allows caching ``setUp`` methods storing their objects on ``self``, see
+    :mod:`sqlalchemy_test_cache.rehydration`.
+
+    Each method has its own dump, and so has each call with different arguments, e.g. of a parameterized test, keyed by
+    a hash of their representation. The calls with arguments represented by their address, whose representation
+    changes on every run, are not cached. With ``share_arguments``, the calls with any arguments share the same dump,
+    for the parameterizations writing the same rows.
+
+    With ``reset``, the rows of every table are deleted before the dump is restored, in the cheapest way of the
+    dialect, see :meth:`DumpManager.reset`.
+
+    With ``tuning``, the durability settings of the database are relaxed while the dump is restored, ``True`` meaning
+    the profile of the dialect, and set back right after. With ``analyze``, the tables restored are analyzed
+    afterwards. See :mod:`sqlalchemy_test_cache.tuning`.
+
+    With ``subset``, a dict of table name to a maximum number of rows or a predicate, only the matching rows of those
+    tables are dumped, along with the rows referenced through foreign keys by any row dumped, see
+    :mod:`sqlalchemy_test_cache.subset`. The function must not rely on the rows left out.
+    """
+
+    dump_format = _get_dump_format(restore_scope, layer, base_layer, deduplicate, dump_format)
 
     def wrapper(test_function):
 
         @functools.wraps(test_function)
         def _wrapper(self, *args, **kwargs):
 
-            path = generate_dump_path(self.__class__.__name__, id(self.__class__))
-            dm = DumpManager(base_model, dbsession)
+            path = generate_layer_path(layer) if layer is not None else _get_dump_path(
+                self, test_function, args, kwargs, share_arguments
+            )
+            test_name = _get_test_name(self, test_function)
 
-            if not os.path.exists(path):
+            if path is None:
+                logger.warning('The arguments of {!r} have no stable representation, so it is not cached.'.format(
+                    test_name
+                ))
+                return test_function(self, *args, **kwargs)
+            dm = _create_dump_manager(base_model, dbsession, render_processes, subset)
 
-                logger.info('Dump file {!r} does not exists. The queries will not be cached.'.format(path))
+            _wait_pending_dumps(path, base_layer)
+
+            metadata = read_dump_metadata(path)
 
+            if metadata.get('disabled'):
+
+                logger.info('Cache of {!r} is disabled as loading the dump does not pay off.'.format(test_name))
+
+                started = time.time()
                 result = test_function(self, *args, **kwargs)
+                _skip_disabled(path, test_name, metadata, time.time() - started)
+
+                return result
+
+            elif not os.path.exists(path) or not _is_base_layer_valid(metadata):
+
+                logger.info('Dump file {!r} does not exists. The queries will not be cached.'.format(path))
+
+                if restore_scope is not None:
+                    _switch_scope(self, dbsession, path, restore_scope)
+
+                result, test_time, accessed_tables = _run_test(
+                    self, test_function, args, kwargs, dm, dbsession, only_accessed_tables
+                )
 
-                write_dump_data_to_file(path, '\n'.join(dm.dump_all_tables()))
+                extra_metadata = _get_extra_metadata(self, dbsession, accessed_tables, rehydrate)
+                dump_args = (dm, path, self, test_function, test_time, base_layer, dump_format, extra_metadata)
+
+                if background:
+                    # Only the rows are fetched in the transaction of the test, the dump is written by the writer.
+                    dm.fetch_all_tables()
+                    writer.submit(path, _dump_and_save, *dump_args)
+                else:
+                    _dump_and_save(*dump_args)
+
+                if restore_scope is not None:
+                    # The rows written by the function are the ones of the dump, so they are kept for the scope.
+                    _enter_scope(self, dbsession, path, restore_scope)
 
                 return result
 
@@ -33,10 +610,24 @@ def cache_sql(base_model, dbsession):
 
                 logger.info('Loading data from cache file: {!r}'.format(path))
 
-                dm.loads(load_dump_data_from_file(path))
+                started = time.time()
+
+                _restore(
+                    self, dm, dbsession, path, metadata, restore_scope,
+                    tables=_get_tables_to_restore(dm, metadata, only_accessed_tables), reset=reset, tuning=tuning,
+                    analyze=analyze
+                )
+
+                if metadata.get('instances'):
+                    rehydrate_instances(self, dbsession, metadata['instances'])
+
+                _finish_restore(path, test_name, metadata, time.time() - started, min_speedup, delete_slow_dumps)
 
                 return
 
+        # Allows the command line tool to discover the test cases depending on cached dumps.
+        _wrapper.cache_sql = True
+
         return _wrapper
 
     return wrapper
@@ -0,0 +1,118 @@
+from __future__ import print_function
+
+import atexit
+import collections
+import sys
+
+
+class CacheEvent(collections.namedtuple(
+        'CacheEvent', ('test', 'path', 'hit', 'test_time', 'dump_time', 'restore_time', 'tables'))):
+    """
+    Emitted by :func:`sqlalchemy_test_cache.cache_sql` every time a decorated function runs.
+
+    ``tables`` maps each table name to the ``rows`` and ``bytes`` it has in the dump. The times are in seconds and
+    are ``None`` when they were not measured, e.g. ``restore_time`` on a cache miss.
+    """
+
+    __slots__ = ()
+
+    @property
+    def time_saved(self):
+
+        if not self.hit or self.test_time is None or self.restore_time is None:
+            return None
+
+        return self.test_time - self.restore_time
+
+
+_hooks = []
+
+
+def add_hook(hook):
+    """
+    Register a callable to receive every :class:`CacheEvent`.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def emit(event):
+    for hook in list(_hooks):
+        hook(event)
+
+
+class MetricsCollector(object):
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def clear(self):
+        del self.events[:]
+
+    def summary(self):
+
+        hits = [event for event in self.events if event.hit]
+        misses = [event for event in self.events if not event.hit]
+
+        return {
+            'hits': len(hits),
+            'misses': len(misses),
+            'dump_time': sum(event.dump_time or 0 for event in misses),
+            'restore_time': sum(event.restore_time or 0 for event in hits),
+            'time_saved': sum(event.time_saved or 0 for event in hits),
+        }
+
+    def report(self, stream=None):
+
+        stream = stream or sys.stderr
+        summary = self.summary()
+
+        print('sqlalchemy-test-cache: {hits} hits, {misses} misses, dump {dump_time:.3f}s, '
+              'restore {restore_time:.3f}s, saved {time_saved:.3f}s'.format(**summary), file=stream)
+
+        by_test = collections.OrderedDict()
+
+        for event in self.events:
+            by_test.setdefault(event.test, []).append(event)
+
+        for test, events in by_test.items():
+
+            restore_times = [event.restore_time for event in events if event.hit]
+            test_time = next((event.test_time for event in events if event.test_time is not None), None)
+
+            print('  {}: {} hits, {} misses, test {}, restore {}, {} rows, {} bytes'.format(
+                test,
+                len(restore_times),
+                len(events) - len(restore_times),
+                '{:.3f}s'.format(test_time) if test_time is not None else '-',
+                '{:.3f}s'.format(sum(restore_times) / len(restore_times)) if restore_times else '-',
+                sum(table['rows'] for table in (events[-1].tables or {}).values()),
+                sum(table['bytes'] for table in (events[-1].tables or {}).values()),
+            ), file=stream)
+
+
+collector = MetricsCollector()
+
+add_hook(collector)
+
+_session_report_streams = []
+
+
+def enable_session_report(stream=None):
+    """
+    Print the report of :data:`collector` when the interpreter exits.
+    """
+
+    if stream in _session_report_streams:
+        return
+
+    _session_report_streams.append(stream)
+    atexit.register(collector.report, stream)
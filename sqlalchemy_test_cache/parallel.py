@@ -0,0 +1,179 @@
+"""
+Rendering of the dumps in a pool of processes.
+
+The rows of each table are fetched in chunks by the main process and rendered by the workers of a pool shared by the
+dumps of the same dialect, while the next chunks are fetched. The rendered chunks are collected in order. The tables
+bound to engines of different dialects are rendered by the pool of each dialect.
+"""
+from __future__ import unicode_literals
+
+import atexit
+import collections
+import itertools
+import logging
+import multiprocessing
+
+from sqlalchemy.engine.url import make_url
+
+from .renderers import get_type_renderer
+from .sqlalchemy_test_cache import DumpManager
+from .utils import render_value
+
+
+logger = logging.getLogger(__name__)
+
+# Attributes of the dialect of the session, set on connection, which change how the values are rendered.
+DIALECT_ATTRIBUTES = ('supports_native_boolean', 'supports_native_uuid', '_backslash_escapes', 'server_version_info')
+
+# The pools of processes, by dialect and number of processes.
+_pools = {}
+
+# The dialect and the renderers of each table in a worker.
+_worker_dialect = None
+_worker_renderers = {}
+
+
+def _create_dialect(name, driver, attributes):
+
+    dialect = make_url('{}+{}://'.format(name, driver)).get_dialect()()
+
+    for attribute, value in attributes:
+        setattr(dialect, attribute, value)
+
+    return dialect
+
+
+def _init_worker(name, driver, attributes):
+    global _worker_dialect
+    _worker_dialect = _create_dialect(name, driver, attributes)
+    _worker_renderers.clear()
+
+
+def _render_value(value, type_):
+    return render_value(_worker_dialect, value, type_)
+
+
+def render_chunk(table_name, column_names, column_types, rows):
+    """
+    Render the insert statements of the rows in a worker.
+    """
+
+    key = (table_name, tuple(column_names))
+
+    if key not in _worker_renderers:
+        _worker_renderers[key] = [get_type_renderer(_worker_dialect, type_, _render_value) for type_ in column_types]
+
+    renderers = _worker_renderers[key]
+    columns = ', '.join(column_names)
+
+    return [
+        DumpManager.INSERT_ROW_TEMPLATE.format(
+            table_name, columns, ', '.join(render(value) for render, value in zip(renderers, row))
+        )
+        for row in rows
+    ]
+
+
+def get_pool(dialect, processes=None):
+    """
+    Return the pool of processes rendering the values for the dialect, created on the first call.
+    """
+
+    attributes = tuple(
+        (attribute, getattr(dialect, attribute)) for attribute in DIALECT_ATTRIBUTES if hasattr(dialect, attribute)
+    )
+    key = (dialect.name, dialect.driver, attributes, processes)
+
+    if key not in _pools:
+        _pools[key] = multiprocessing.Pool(processes, _init_worker, (dialect.name, dialect.driver, attributes))
+
+    return _pools[key]
+
+
+def close_pools():
+
+    for pool in _pools.values():
+        pool.terminate()
+        pool.join()
+
+    _pools.clear()
+
+
+atexit.register(close_pools)
+
+
+class ParallelDumpManager(DumpManager):
+    """
+    The rows of each table are fetched in chunks of ``chunk_size`` rows and rendered by a pool of ``processes``
+    processes (the number of CPUs by default), at most ``max_pending`` chunks being rendered at a time.
+
+    Inside a daemonic process, e.g. a worker of the command line tool, which can not have children, the rows are
+    rendered by the process itself.
+    """
+
+    def __init__(self, base_model, dbsession, processes=None, chunk_size=1000, max_pending=None, **kwargs):
+        super(ParallelDumpManager, self).__init__(base_model, dbsession, **kwargs)
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * (processes or multiprocessing.cpu_count())
+
+    def _get_pool(self, dialect):
+
+        if multiprocessing.current_process().daemon:
+            return None
+
+        # The pools are shared by the dumps of the same dialect, with the same attributes, see ``get_pool``.
+        return get_pool(dialect, self.processes)
+
+    def _iter_chunks(self, table):
+
+        rows = self._get_table_rows(table)
+
+        if hasattr(rows, 'yield_per'):
+            rows = rows.yield_per(self.chunk_size)
+
+        rows = iter(rows)
+
+        while True:
+
+            chunk = [tuple(row) for row in itertools.islice(rows, self.chunk_size)]
+
+            if not chunk:
+                break
+
+            yield chunk
+
+    def fetch_all_tables(self):
+        super(ParallelDumpManager, self).fetch_all_tables()
+        # Created while the session is at hand, as the dump may be rendered in another thread.
+        for bind in self.get_binds():
+            self._get_pool(bind.dialect)
+
+    def dump(self, table):
+
+        pool = self._get_pool(self.get_table_bind(table).dialect)
+
+        if pool is None:
+            return super(ParallelDumpManager, self).dump(table)
+
+        logger.info('Generating dump for the table: {!r}'.format(table.name))
+
+        columns = self._get_table_columns(table)
+        table_args = (str(table), [column.name for column in columns], [column.type for column in columns])
+
+        statements = []
+        pending = collections.deque()
+
+        for chunk in self._iter_chunks(table):
+
+            pending.append(pool.apply_async(render_chunk, table_args + (chunk,)))
+
+            if len(pending) >= self.max_pending:
+                statements.extend(pending.popleft().get())
+
+        while pending:
+            statements.extend(pending.popleft().get())
+
+        self._update_table_stats(table, statements)
+
+        return statements
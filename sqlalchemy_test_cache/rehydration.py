@@ -0,0 +1,147 @@
+"""
+Rehydration of the mapped objects stored on the test case.
+
+When the function runs, the attributes of the test case holding mapped instances, or lists or tuples of them, are
+recorded by class and identity, i.e. primary key. When the dump is restored instead, the instances of each class are
+loaded by a single query on their primary keys and set back on the test case, the tuples as lists.
+"""
+from __future__ import unicode_literals
+
+import collections
+import importlib
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.orm.state import InstanceState
+
+
+logger = logging.getLogger(__name__)
+
+# The types of the primary key values which are stored as they are in the JSON metadata.
+try:
+    JSON_TYPES = (bool, int, long, float, basestring, type(None))
+except NameError:
+    JSON_TYPES = (bool, int, float, str, type(None))
+
+
+def get_class_path(klass):
+    return '{}.{}'.format(klass.__module__, getattr(klass, '__qualname__', klass.__name__))
+
+
+def import_class(class_path):
+
+    module_name, _, class_name = class_path.rpartition('.')
+
+    # Nested classes are looked up through their enclosing classes.
+    while module_name:
+        try:
+            value = importlib.import_module(module_name)
+        except ImportError:
+            module_name, _, enclosing_name = module_name.rpartition('.')
+            class_name = '{}.{}'.format(enclosing_name, class_name)
+        else:
+            break
+    else:
+        raise ImportError('No module of the class {!r}.'.format(class_path))
+
+    for name in class_name.split('.'):
+        value = getattr(value, name)
+
+    return value
+
+
+def _get_mapped_state(value):
+
+    state = sa.inspect(value, raiseerr=False)
+
+    return state if isinstance(state, InstanceState) else None
+
+
+def _record_instance(value):
+    """
+    Return the class path and the identity of the mapped instance, or ``None`` when it is not a persisted instance
+    with an identity which can be stored as JSON.
+    """
+
+    state = _get_mapped_state(value)
+
+    if state is None or state.identity is None or not all(isinstance(key, JSON_TYPES) for key in state.identity):
+        return None
+
+    return [get_class_path(state.class_), list(state.identity)]
+
+
+def record_instances(test_case):
+    """
+    Return the attributes of the test case holding mapped instances, or lists or tuples of them, as the class path and
+    identity of each instance. The attributes holding instances which can not be recorded are left out.
+    """
+
+    attributes = {}
+
+    for name, value in sorted(vars(test_case).items()):
+
+        many = isinstance(value, (list, tuple))
+        values = value if many else [value]
+
+        if not values or not all(_get_mapped_state(item) is not None for item in values):
+            continue
+
+        instances = [_record_instance(item) for item in values]
+
+        if any(instance is None for instance in instances):
+            logger.warning('The attribute {!r} holds objects without a primary key, so it is not rehydrated.'.format(name))
+            continue
+
+        attributes[name] = {'many': many, 'instances': instances}
+
+    return attributes
+
+
+def _load_instances(dbsession, klass, identities):
+    """
+    Return the instances of the mapped class with the given identities, by identity, loaded by a single query.
+    """
+
+    mapper = sa.inspect(klass)
+    primary_key = mapper.primary_key
+
+    if len(primary_key) == 1:
+        criterion = primary_key[0].in_([identity[0] for identity in identities])
+    else:
+        criterion = sa.tuple_(*primary_key).in_(identities)
+
+    return {
+        tuple(mapper.identity_key_from_instance(instance)[1]): instance
+        for instance in dbsession.query(klass).filter(criterion)
+    }
+
+
+def rehydrate_instances(test_case, dbsession, attributes):
+    """
+    Set the recorded attributes on the test case, loading the instances of each class by a single query.
+    """
+
+    identities = collections.defaultdict(set)
+
+    for attribute in attributes.values():
+        for class_path, identity in attribute['instances']:
+            identities[class_path].add(tuple(identity))
+
+    loaded = {}
+
+    for class_path, class_identities in identities.items():
+
+        instances = _load_instances(dbsession, import_class(class_path), sorted(class_identities))
+
+        for identity in class_identities:
+            loaded[(class_path, identity)] = instances.get(identity)
+
+    for name, attribute in attributes.items():
+
+        values = [loaded[(class_path, tuple(identity))] for class_path, identity in attribute['instances']]
+
+        if attribute['many']:
+            setattr(test_case, name, values)
+        else:
+            setattr(test_case, name, values[0])
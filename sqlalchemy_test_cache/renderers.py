@@ -0,0 +1,222 @@
+"""
+Renderers of the column values as SQL literals.
+
+:func:`get_type_renderer` builds, once per column, a function rendering the values of its type for the dialect. The
+values which do not have the expected Python type, and the types without a renderer here, are rendered by the
+fallback, i.e. the literal compiler of the dialect.
+"""
+from __future__ import unicode_literals
+
+import binascii
+import datetime
+import decimal
+import json
+import math
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+try:
+    string_types, integer_types = (basestring,), (int, long)
+except NameError:
+    string_types, integer_types = (str,), (int,)
+
+
+NULL = 'Null'
+
+NON_FINITE_LITERALS = {'nan': "'NaN'", 'inf': "'Infinity'", '-inf': "'-Infinity'"}
+
+
+def quote_string(dialect, value):
+
+    # MySQL takes the backslashes as escapes, unless the NO_BACKSLASH_ESCAPES mode is set.
+    if getattr(dialect, '_backslash_escapes', False):
+        value = value.replace('\\', '\\\\')
+
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def _checked(python_types, render, type_, fallback):
+    """
+    Wrap the renderer of the values of ``python_types``, rendering ``None`` as NULL and any other value by the
+    fallback.
+    """
+
+    def _render(value):
+
+        if value is None:
+            return NULL
+
+        if isinstance(value, python_types):
+            return render(value)
+
+        return fallback(value, type_)
+
+    return _render
+
+
+def _render_boolean(dialect, type_, fallback):
+
+    true, false = ('true', 'false') if dialect.supports_native_boolean else ('1', '0')
+
+    return _checked((bool,), lambda value: true if value else false, type_, fallback)
+
+
+def _render_integer(dialect, type_, fallback):
+    # ``int()`` as ``str(True)`` is not a valid integer literal.
+    return _checked(integer_types, lambda value: str(int(value)), type_, fallback)
+
+
+def _is_finite(value):
+
+    if isinstance(value, decimal.Decimal):
+        return value.is_finite()
+
+    return not (math.isnan(value) or math.isinf(value))
+
+
+def _render_numeric(dialect, type_, fallback):
+
+    def render(value):
+
+        if isinstance(value, integer_types):
+            return str(int(value))
+
+        if _is_finite(value):
+            return repr(value) if isinstance(value, float) else str(value)
+
+        if dialect.name == 'postgresql':
+            return NON_FINITE_LITERALS['nan' if value != value else ('inf' if value > 0 else '-inf')]
+
+        return fallback(value, type_)
+
+    return _checked(integer_types + (float, decimal.Decimal), render, type_, fallback)
+
+
+def _render_string(dialect, type_, fallback):
+    return _checked(string_types, lambda value: quote_string(dialect, value), type_, fallback)
+
+
+def _render_enum(dialect, type_, fallback):
+
+    # Converts the members of the enum class, if any, to the values stored in the database.
+    process = type_.dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+
+    def render(value):
+
+        value = process(value)
+
+        if isinstance(value, string_types):
+            return quote_string(dialect, value)
+
+        return fallback(value, type_)
+
+    return _checked((object,), render, type_, fallback)
+
+
+def _render_temporal(dialect, type_, fallback):
+
+    if dialect.name == 'sqlite':
+        # Stored as strings in the format of the SQLAlchemy type, which parses them back.
+        process = type_.dialect_impl(dialect).bind_processor(dialect) or str
+    else:
+        # Timezone aware datetimes keep their UTC offset, e.g. '2016-11-16 10:30:00+02:00'.
+        process = str
+
+    return _checked(
+        (datetime.date, datetime.time), lambda value: quote_string(dialect, process(value)), type_, fallback
+    )
+
+
+def _render_binary(dialect, type_, fallback):
+
+    if dialect.name == 'postgresql':
+        template = "'\\x{}'"
+    elif dialect.name in ('sqlite', 'mysql', 'mariadb'):
+        template = "X'{}'"
+    else:
+        return lambda value: fallback(value, type_)
+
+    def render(value):
+        return template.format(binascii.hexlify(memoryview(value).tobytes()).decode('ascii'))
+
+    return _checked((bytes, bytearray, memoryview), render, type_, fallback)
+
+
+def _render_json(dialect, type_, fallback):
+    return _checked((object,), lambda value: quote_string(dialect, json.dumps(value)), type_, fallback)
+
+
+def _render_array(dialect, type_, fallback):
+
+    if dialect.name != 'postgresql':
+        return lambda value: fallback(value, type_)
+
+    render_item = get_type_renderer(dialect, type_.item_type, fallback)
+    cast = type_.compile(dialect=dialect)
+
+    def render_elements(values):
+        return 'ARRAY[{}]'.format(', '.join(
+            render_elements(value) if isinstance(value, (list, tuple)) else render_item(value) for value in values
+        ))
+
+    def render(value):
+
+        if not value:
+            return "'{{}}'::{}".format(cast)
+
+        return '{}::{}'.format(render_elements(value), cast)
+
+    return _checked((list, tuple), render, type_, fallback)
+
+
+def _render_uuid(dialect, type_, fallback):
+
+    native = getattr(type_, 'native_uuid', True) and getattr(dialect, 'supports_native_uuid', dialect.name == 'postgresql')
+
+    def render(value):
+
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(value)
+
+        # The non native UUIDs are stored as 32 hexadecimal characters by SQLAlchemy.
+        return quote_string(dialect, str(value) if native else value.hex)
+
+    return _checked((uuid.UUID,) + string_types, render, type_, fallback)
+
+
+# Type class: factory of the renderer given the dialect, the type and the fallback. The renderer of the nearest class in
+# the MRO of the column type is used, e.g. ``Enum`` before ``String`` and ``JSONB`` as ``JSON``.
+RENDERERS = {
+    sa.Boolean: _render_boolean,
+    sa.Integer: _render_integer,
+    sa.Numeric: _render_numeric,
+    sa.Float: _render_numeric,
+    sa.String: _render_string,
+    sa.Enum: _render_enum,
+    sa.Date: _render_temporal,
+    sa.DateTime: _render_temporal,
+    sa.Time: _render_temporal,
+    sa.LargeBinary: _render_binary,
+    sa.JSON: _render_json,
+    sa.ARRAY: _render_array,
+    postgresql.UUID: _render_uuid,
+}
+
+if hasattr(sa, 'Uuid'):  # SQLAlchemy 2.0+
+    RENDERERS[sa.Uuid] = _render_uuid
+
+
+def get_type_renderer(dialect, type_, fallback):
+    """
+    Return the function rendering the values of the column type for the dialect. The values without a renderer are
+    rendered by ``fallback(value, type_)``.
+    """
+
+    for klass in type(type_).__mro__:
+        if klass in RENDERERS:
+            return RENDERERS[klass](dialect, type_, fallback)
+
+    return lambda value: fallback(value, type_)
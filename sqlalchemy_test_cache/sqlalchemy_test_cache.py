@@ -1,13 +1,23 @@
 from __future__ import unicode_literals
 
+import collections
+import functools
 import logging
 import operator
 try:
     from functools import reduce
 except ImportError:
     pass  # py2
+from multiprocessing.pool import ThreadPool
 
-from .utils import render_value
+import sqlalchemy as sa
+from sqlalchemy.pool import SingletonThreadPool
+
+from .columnar import encode_table
+from .renderers import get_type_renderer
+from .subset import fetch_subset
+from .translation import get_translated_insert
+from .utils import get_statement_table, render_value
 
 
 logger = logging.getLogger(__name__)
@@ -17,9 +27,25 @@ class DumpManager(object):
 
     INSERT_ROW_TEMPLATE = 'INSERT INTO "{0}" ({1}) VALUES ({2});'
 
-    def __init__(self, base_model, dbsession):
+    # Drivers which run the many statements of a script in a single round trip, when it is sent without parameters.
+    SCRIPT_DRIVERS = ('psycopg2', 'psycopg')
+
+    # The MySQL drivers run scripts only when connected with the CLIENT.MULTI_STATEMENTS flag.
+    MYSQL_SCRIPT_DRIVERS = ('pymysql',)
+    MYSQL_MULTI_STATEMENTS_FLAG = 1 << 16
+
+    # The tables checked by each query of ``get_non_empty_tables``, below the limit of SQLite on compound selects.
+    EXISTS_QUERY_TABLES = 100
+
+    def __init__(self, base_model, dbsession, batch_bytes=1024 * 1024, subset=None):
         self.base_model = base_model
         self.dbsession = dbsession
+        self.batch_bytes = batch_bytes
+        self.subset = subset
+        self.table_stats = {}
+        self._column_renderers = {}
+        self._fetched_rows = {}
+        self._table_binds = {}
 
     def _get_table_columns(self, table):
         return [column for column in table.columns.values()]
@@ -27,46 +53,501 @@ class DumpManager(object):
     def _get_table_columns_name(self, table):
         return [column.name for column in self._get_table_columns(table)]
 
-    def _get_table_rows(self, table):
+    def _get_order_by_column(self, table):
         table_columns_name = self._get_table_columns_name(table)
         if 'created' in table_columns_name:
-            return self.dbsession.query(table).order_by(table.columns.created)
+            return table.columns.created
         elif 'id' in table_columns_name:
-            return self.dbsession.query(table).order_by(table.columns.id)
-        else:
-            return self.dbsession.query(table)
+            return table.columns.id
+        return None
 
-    def _dump_row_values(self, row, columns):
-        return [
-            render_value(self.dbsession.bind.dialect, value, columns[i].type) for i, value in enumerate(row)
-        ]
+    def _get_table_query(self, table):
+        order_by_column = self._get_order_by_column(table)
+        if order_by_column is not None:
+            return self.dbsession.query(table).order_by(order_by_column)
+        return self.dbsession.query(table)
+
+    def _get_table_select(self, table):
+        order_by_column = self._get_order_by_column(table)
+        if order_by_column is not None:
+            return table.select().order_by(order_by_column)
+        return table.select()
+
+    def _get_table_rows(self, table):
+        # The rows of every table are fetched at once when subsetting, as each one depends on the ones referencing it.
+        if self.subset and not self._fetched_rows:
+            self._fetched_rows.update(
+                fetch_subset(self._get_table_query, self.tables, self.subset, self._get_order_by_column)
+            )
+        if table.name in self._fetched_rows:
+            return self._fetched_rows[table.name]
+        return self._get_table_query(table)
+
+    def _get_table_mapper(self, table):
+
+        registry = getattr(self.base_model, 'registry', None)
+
+        for mapper in getattr(registry, 'mappers', ()):
+            if table in mapper.tables:
+                return mapper
+
+        return None
+
+    def get_table_bind(self, table):
+        """
+        Return the engine of the table: the one the session binds to the table, or to its mapped class, or the engine of
+        the session.
+        """
+
+        if table.name not in self._table_binds:
+            try:
+                bind = self.dbsession.get_bind(clause=table)
+            except sa.exc.UnboundExecutionError:
+                # The engines bound to the base classes of the models are only found through the mapper of the table.
+                bind = self.dbsession.get_bind(mapper=self._get_table_mapper(table), clause=table)
+            self._table_binds[table.name] = bind
+
+        return self._table_binds[table.name]
+
+    def get_tables_by_bind(self):
+        """
+        Return the tables of each engine, as (engine, tables) pairs in the order of the first table of each engine.
+        """
+
+        tables_by_bind = collections.OrderedDict()
+
+        for table in self.tables:
+            tables_by_bind.setdefault(self.get_table_bind(table), []).append(table)
+
+        return list(tables_by_bind.items())
+
+    def get_binds(self):
+        return [bind for bind, _ in self.get_tables_by_bind()] or [self.dbsession.get_bind()]
+
+    def get_dialect_name(self):
+        """
+        Return the name of the dialect of the tables, the names of the dialects separated by commas when the tables are
+        bound to engines of different dialects.
+        """
+
+        return ','.join(sorted(set(bind.dialect.name for bind in self.get_binds())))
+
+    def _get_connection(self, bind):
+        try:
+            return self.dbsession.connection(bind_arguments={'bind': bind})
+        except TypeError:  # SQLAlchemy < 1.4
+            return self.dbsession.connection(bind=bind)
+
+    def _map_binds(self, function, binds):
+        """
+        Return ``function(bind)`` of each engine, called in a thread of its own for each engine, except the ones whose
+        connections are bound to the thread opening them, e.g. SQLite in memory, called in the current thread.
+        """
+
+        threaded = [bind for bind in binds if not isinstance(bind.pool, SingletonThreadPool)]
+        results = {}
+
+        if len(threaded) > 1:
+            pool = ThreadPool(len(threaded))
+            try:
+                results.update(zip(threaded, pool.map(function, threaded)))
+            finally:
+                pool.close()
+                pool.join()
+
+        return [results[bind] if bind in results else function(bind) for bind in binds]
+
+    def _get_column_renderers(self, columns, dialect):
+        """
+        Return the renderer of each column, built once for the dialect, see :mod:`sqlalchemy_test_cache.renderers`.
+        """
+
+        key = tuple(columns)
+
+        if key not in self._column_renderers:
+
+            # The values without a renderer go through the literal compiler of the dialect.
+            def fallback(value, type_):
+                return render_value(dialect, value, type_)
+
+            self._column_renderers[key] = [get_type_renderer(dialect, column.type, fallback) for column in columns]
+
+        return self._column_renderers[key]
+
+    def _dump_row_values(self, row, columns, dialect):
+        return [render(value) for render, value in zip(self._get_column_renderers(columns, dialect), row)]
 
     def _build_insert_row(self, table, row):
         return self.INSERT_ROW_TEMPLATE.format(
             table,
             ', '.join(self._get_table_columns_name(table)),
-            ', '.join(self._dump_row_values(row, self._get_table_columns(table)))
+            ', '.join(self._dump_row_values(row, self._get_table_columns(table), self.get_table_bind(table).dialect))
         )
 
+    def _update_table_stats(self, table, statements):
+        self.table_stats[table.name] = {
+            'rows': len(statements),
+            'bytes': sum(len(statement.encode('utf-8')) + 1 for statement in statements),
+        }
+
     @property
     def tables(self):
         return self.base_model.metadata.sorted_tables
 
+    def get_required_tables(self, table_names):
+        """
+        Return the names of the tables along with the ones they refer to through foreign keys, recursively, which
+        must be restored as well for the rows to be consistent.
+        """
+
+        tables = {table.name: table for table in self.tables}
+        required = set()
+        pending = [name for name in table_names if name in tables]
+
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(
+                    fk.column.table.name for fk in tables[name].foreign_keys if fk.column.table.name in tables
+                )
+
+        return required
+
+    def _fetch_tables_by_bind(self):
+        """
+        Fetch the rows of the tables of each engine in a thread of its own, on the connection of the session to the
+        engine, when the tables are bound to several engines and not subset.
+        """
+
+        tables_by_bind = self.get_tables_by_bind()
+
+        if len(tables_by_bind) < 2 or self.subset or self._fetched_rows:
+            return
+
+        # The connections are taken from the session, which is not thread safe, before the threads start.
+        work = {bind: (self._get_connection(bind), tables) for bind, tables in tables_by_bind}
+
+        def fetch(bind):
+            connection, tables = work[bind]
+            return [(table.name, list(connection.execute(self._get_table_select(table)))) for table in tables]
+
+        for rows_by_table in self._map_binds(fetch, list(work)):
+            self._fetched_rows.update(rows_by_table)
+
+    def fetch_all_tables(self):
+        """
+        Fetch the rows of every table in the current transaction and build the renderers of their columns, so the
+        tables are dumped afterwards without the database or the session, e.g. in another thread.
+        """
+
+        self._fetch_tables_by_bind()
+
+        for table in self.tables:
+            self._fetched_rows[table.name] = list(self._get_table_rows(table))
+            self._get_column_renderers(self._get_table_columns(table), self.get_table_bind(table).dialect)
+
     def dump(self, table):
 
         logger.info('Generating dump for the table: {!r}'.format(table.name))
 
-        return [self._build_insert_row(table, row) for row in self._get_table_rows(table)]
+        statements = [self._build_insert_row(table, row) for row in self._get_table_rows(table)]
+
+        self._update_table_stats(table, statements)
+
+        return statements
 
     def dump_all_tables(self):
 
         logger.info('Starting dump process of {} tables'.format(len(self.tables)))
 
+        self._fetch_tables_by_bind()
+
         return reduce(operator.add, map(self.dump, self.tables))
 
-    def loads(self, content):
+    def dump_columnar(self, table):
+        """
+        Return the block of the table in the columnar format, see :mod:`sqlalchemy_test_cache.columnar`.
+        """
+
+        logger.info('Generating columnar dump for the table: {!r}'.format(table.name))
+
+        rows = list(self._get_table_rows(table))
+        block = encode_table(table.name, self._get_table_columns_name(table), rows)
+
+        self.table_stats[table.name] = {'rows': len(rows), 'bytes': len(block)}
+
+        return block
+
+    def dump_all_tables_columnar(self):
+
+        logger.info('Starting columnar dump process of {} tables'.format(len(self.tables)))
+
+        self._fetch_tables_by_bind()
+
+        return [self.dump_columnar(table) for table in self.tables]
+
+    def get_non_empty_tables(self):
+        """
+        Return the names of the tables with rows, checked by a single ``UNION ALL`` of ``EXISTS`` queries for the
+        tables of each engine.
+        """
+
+        names = set()
+
+        for bind, tables in self.get_tables_by_bind():
+
+            connection = self._get_connection(bind)
+
+            for start in range(0, len(tables), self.EXISTS_QUERY_TABLES):
+
+                queries = [
+                    self.dbsession.query(sa.literal(table.name, sa.String)).filter(sa.exists().select_from(table))
+                    for table in tables[start:start + self.EXISTS_QUERY_TABLES]
+                ]
+
+                names.update(row[0] for row in connection.execute(queries[0].union_all(*queries[1:]).statement))
+
+        return names
+
+    def _reset_sqlite(self, connection, tables):
+
+        execute = getattr(connection, 'exec_driver_sql', connection.execute)
+
+        # The foreign keys can not be disabled inside a transaction, so they are only checked on commit.
+        execute('PRAGMA defer_foreign_keys = ON')
+
+        for table in reversed(tables):
+            connection.execute(table.delete())
+
+        # The tables with AUTOINCREMENT keep their last id in sqlite_sequence.
+        if execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").first():
+            execute('DELETE FROM sqlite_sequence WHERE name IN ({})'.format(
+                ', '.join("'{}'".format(table.name.replace("'", "''")) for table in tables)
+            ))
+
+    def _reset_mysql(self, connection, tables):
+
+        execute = getattr(connection, 'exec_driver_sql', connection.execute)
+
+        execute('SET FOREIGN_KEY_CHECKS = 0')
+
+        try:
+            for table in tables:
+                connection.execute(table.delete())
+        finally:
+            execute('SET FOREIGN_KEY_CHECKS = 1')
+
+    def _reset_bind(self, bind, tables):
+
+        dialect = bind.dialect
+        connection = self._get_connection(bind)
+
+        if dialect.name == 'postgresql':
+            getattr(connection, 'exec_driver_sql', connection.execute)('TRUNCATE {} RESTART IDENTITY CASCADE'.format(
+                ', '.join(dialect.identifier_preparer.format_table(table) for table in tables)
+            ))
+        elif dialect.name == 'sqlite':
+            self._reset_sqlite(connection, tables)
+        elif dialect.name in ('mysql', 'mariadb'):
+            self._reset_mysql(connection, tables)
+        else:
+            for table in reversed(tables):
+                connection.execute(table.delete())
+
+    def reset(self):
+        """
+        Delete the rows of every table, skipping the empty ones: a single ``TRUNCATE`` of the tables, restarting their
+        sequences, on PostgreSQL, and a ``DELETE`` of each table with the foreign keys checked on commit on SQLite and
+        unchecked on MySQL. The other dialects delete the tables in the reverse order of their dependencies. The tables
+        of each engine are reset the way of its dialect.
+        """
+
+        names = self.get_non_empty_tables()
+        tables_by_bind = [
+            (bind, [table for table in tables if table.name in names]) for bind, tables in self.get_tables_by_bind()
+        ]
+        tables_by_bind = [(bind, tables) for bind, tables in tables_by_bind if tables]
+
+        if not tables_by_bind:
+            return
+
+        logger.info('Deleting the rows of {} tables'.format(sum(len(tables) for _, tables in tables_by_bind)))
+
+        for bind, tables in tables_by_bind:
+            self._reset_bind(bind, tables)
+
+        # The objects of the deleted rows must not be flushed or returned by the identity map.
+        self.dbsession.expire_all()
+
+    def _get_statement_executor(self, bind=None):
+        # Plain strings are not accepted by ``Session.execute`` since SQLAlchemy 1.4, and ``text()`` would take any
+        # ``:word`` inside the dumped values as a bind parameter, so the statements go straight to the driver.
+        connection = self.dbsession.connection() if bind is None else self._get_connection(bind)
+        return getattr(connection, 'exec_driver_sql', connection.execute)
+
+    def _execute_mysql_script(self, connection, statements):
+
+        cursor = connection.connection.cursor()
+
+        try:
+            cursor.execute('\n'.join(statements))
+            # The results of every statement must be consumed before the next query.
+            while cursor.nextset():
+                pass
+        finally:
+            cursor.close()
+
+    def _execute_with_driver_cursor(self, connection, statements):
+
+        cursor = connection.connection.cursor()
+
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    def _get_batch_executor(self, bind):
+        """
+        Return the function executing a batch of statements on the engine, in a single round trip when the driver runs
+        scripts.
+        """
+
+        connection = self._get_connection(bind)
+        dialect = bind.dialect
+
+        if dialect.driver in self.SCRIPT_DRIVERS:
+            execute = self._get_statement_executor(bind)
+            return lambda statements: execute('\n'.join(statements))
+
+        if dialect.driver in self.MYSQL_SCRIPT_DRIVERS and \
+                getattr(connection.connection, 'client_flag', 0) & self.MYSQL_MULTI_STATEMENTS_FLAG:
+            return functools.partial(self._execute_mysql_script, connection)
+
+        if dialect.name == 'sqlite':
+            # ``executescript`` commits the transaction first, so the statements go one by one, straight to the
+            # driver cursor.
+            return functools.partial(self._execute_with_driver_cursor, connection)
+
+        execute = self._get_statement_executor(bind)
+
+        def execute_statements(statements):
+            for statement in statements:
+                execute(statement)
+
+        return execute_statements
+
+    def _iter_batches(self, content, tables=None):
+        """
+        Group the statements in batches of at most ``batch_bytes`` bytes, a single statement being bigger than that
+        making a batch on its own.
+        """
+
+        batch, size = [], 0
 
         for line in content:
-            self.dbsession.execute(line.strip())
+
+            line = line.strip()
+
+            if not line or (tables is not None and get_statement_table(line) not in tables):
+                continue
+
+            statement_size = len(line.encode('utf-8')) + 1
+
+            if batch and size + statement_size > self.batch_bytes:
+                yield batch
+                batch, size = [], 0
+
+            batch.append(line)
+            size += statement_size
+
+        if batch:
+            yield batch
+
+    def _loads_by_bind(self, content, tables, binds):
+        """
+        Execute the statements inserting into the tables of each engine in a thread of its own, the statements of the
+        tables out of the metadata on the first engine.
+        """
+
+        table_binds = {table.name: self.get_table_bind(table) for table in self.tables}
+        statements = collections.OrderedDict((bind, []) for bind in binds)
+
+        for line in content:
+            line = line.strip()
+            if line:
+                statements[table_binds.get(get_statement_table(line), binds[0])].append(line)
+
+        # The connections are taken from the session, which is not thread safe, before the threads start.
+        executors = {bind: self._get_batch_executor(bind) for bind in binds}
+
+        def load(bind):
+            for batch in self._iter_batches(statements[bind], tables):
+                executors[bind](batch)
+
+        self._map_binds(load, binds)
+
+    def loads(self, content, tables=None):
+        """
+        Execute the statements of the dump, only the ones inserting into ``tables`` when given, in batches of at most
+        ``batch_bytes`` bytes. The statements of each engine are executed in a thread of its own when the tables are
+        bound to several engines.
+        """
+
+        binds = self.get_binds()
+
+        if len(binds) > 1:
+            self._loads_by_bind(content, tables, binds)
+        else:
+            execute_batch = self._get_batch_executor(binds[0])
+            for batch in self._iter_batches(content, tables):
+                execute_batch(batch)
+
+        self.dbsession.flush()
+
+    def _insert_blocks(self, connection, content, batch_size, translate):
+
+        tables = {table.name: table for table in self.tables}
+
+        for table_name, column_names, rows in content:
+
+            table = tables[table_name]
+
+            # The parameters are named after the keys of the columns, which may differ from their names.
+            if translate:
+                insert, parameters = get_translated_insert(table, connection.dialect)
+            else:
+                insert, parameters = table.insert(), {column.key: column.key for column in self._get_table_columns(table)}
+
+            column_keys = {column.name: parameters[column.key] for column in self._get_table_columns(table)}
+            keys = [column_keys[name] for name in column_names]
+
+            for start in range(0, len(rows), batch_size):
+                connection.execute(insert, [dict(zip(keys, row)) for row in rows[start:start + batch_size]])
+
+    def loads_columnar(self, content, batch_size=1000, translate=False):
+        """
+        Insert the rows of each table given as its name, column names and rows, in batches of ``batch_size`` rows
+        executed as a single ``executemany``. With ``translate``, the rows were dumped on another dialect, see
+        :mod:`sqlalchemy_test_cache.translation`. The tables of each engine are inserted in a thread of its own when
+        the tables are bound to several engines.
+        """
+
+        binds = self.get_binds()
+
+        if len(binds) == 1:
+            self._insert_blocks(self._get_connection(binds[0]), content, batch_size, translate)
+        else:
+            tables = {table.name: table for table in self.tables}
+            connections = collections.OrderedDict((bind, self._get_connection(bind)) for bind in binds)
+            blocks = collections.OrderedDict((bind, []) for bind in binds)
+
+            for block in content:
+                blocks[self.get_table_bind(tables[block[0]])].append(block)
+
+            self._map_binds(
+                lambda bind: self._insert_blocks(connections[bind], blocks[bind], batch_size, translate), binds
+            )
 
         self.dbsession.flush()
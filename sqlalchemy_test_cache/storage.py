@@ -0,0 +1,118 @@
+"""
+Content addressed storage of the dumps.
+
+The statements of each table are stored in a chunk file named after the hash of its content, so the chunks shared by
+many dumps (e.g. lookup tables or a common seed) are stored and read once. The dump file itself is a manifest with the
+table and the hash of each chunk.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import itertools
+import json
+import os
+
+from .utils import get_cache_dir, get_statement_table, iter_statements
+
+
+CHUNKS_DIR = 'chunks'
+CHUNK_FILE_EXTENSION = '.chunk'
+
+# The statements of each chunk read in this process, by hash.
+_chunks = {}
+
+
+def get_chunks_dir(basedir=None):
+    return os.path.join(basedir or get_cache_dir(), CHUNKS_DIR)
+
+
+def generate_chunk_path(chunk_hash, basedir=None):
+    return os.path.join(get_chunks_dir(basedir), '{}{}'.format(chunk_hash, CHUNK_FILE_EXTENSION))
+
+
+def generate_chunk_hash(chunk_data):
+    return hashlib.sha1(chunk_data.encode('utf-8')).hexdigest()
+
+
+def group_statements_by_table(statements):
+    return [(table, list(group)) for table, group in itertools.groupby(statements, get_statement_table)]
+
+
+def write_chunk(chunk_data, basedir=None):
+
+    chunk_hash = generate_chunk_hash(chunk_data)
+    chunk_path = generate_chunk_path(chunk_hash, basedir)
+
+    if not os.path.exists(chunk_path):
+
+        if not os.path.isdir(os.path.dirname(chunk_path)):
+            try:
+                os.makedirs(os.path.dirname(chunk_path))
+            except OSError:  # created meanwhile by another process
+                pass
+
+        # Written aside and renamed, so a concurrent reader never sees a partial chunk.
+        tmp_path = '{}.{}.tmp'.format(chunk_path, os.getpid())
+
+        with open(tmp_path, 'w') as f:
+            f.write(chunk_data)
+
+        os.rename(tmp_path, chunk_path)
+
+    return chunk_hash
+
+
+def write_chunked_dump(dump_file_path, statements, basedir=None):
+    """
+    Write the chunks which are not stored yet and the manifest of the dump, returning the manifest content. The chunks
+    are stored next to the dump file unless ``basedir`` is given.
+    """
+
+    basedir = basedir or os.path.dirname(dump_file_path)
+
+    manifest = {
+        'chunks': [
+            [table, write_chunk('\n'.join(table_statements), basedir)]
+            for table, table_statements in group_statements_by_table(statements)
+        ]
+    }
+
+    manifest_data = json.dumps(manifest, sort_keys=True)
+
+    with open(dump_file_path, 'w') as f:
+        f.write(manifest_data)
+
+    return manifest_data
+
+
+def read_manifest(dump_file_path):
+
+    with open(dump_file_path) as f:
+        return json.load(f)
+
+
+def load_chunk(chunk_hash, basedir=None):
+
+    if chunk_hash not in _chunks:
+        with open(generate_chunk_path(chunk_hash, basedir)) as f:
+            _chunks[chunk_hash] = list(iter_statements(f))
+
+    return _chunks[chunk_hash]
+
+
+def load_chunked_dump(dump_file_path, basedir=None, tables=None):
+    """
+    Yield the statements of the dump, skipping the chunks of the tables not in ``tables`` when given.
+    """
+
+    basedir = basedir or os.path.dirname(dump_file_path)
+
+    for table, chunk_hash in read_manifest(dump_file_path)['chunks']:
+        if tables is not None and table not in tables:
+            continue
+        for statement in load_chunk(chunk_hash, basedir):
+            yield statement
+
+
+def clear_chunk_cache():
+    _chunks.clear()
@@ -0,0 +1,198 @@
+"""
+Subsetting of the rows dumped, consistent with the foreign keys.
+
+The tables with a rule, i.e. a maximum number of rows or a predicate, only dump the rows matching it, along with the
+rows referenced through foreign keys by any row dumped. The tables are walked from the children to their parents, in
+the reverse order of their dependencies, so every row referencing a table is known before the table is fetched. The
+rows referenced by rows of the same table are fetched until none is missing.
+"""
+from __future__ import unicode_literals
+
+import collections
+
+import sqlalchemy as sa
+
+
+# The values looked up by each ``IN`` criterion.
+IN_CHUNK_SIZE = 500
+
+
+def _get_positions(table, columns):
+    table_columns = list(table.columns)
+    return [table_columns.index(column) for column in columns]
+
+
+def _project(rows, positions):
+    """
+    Return the values of the columns at ``positions`` of each row, except the ones with a ``NULL``.
+    """
+
+    values = set()
+
+    for row in rows:
+        value = tuple(row[position] for position in positions)
+        if None not in value:
+            values.add(value)
+
+    return values
+
+
+def _apply_rule(query, table, rule):
+    """
+    Apply the rule of the table: a maximum number of rows, a SQL expression or a function returning it given the table.
+    """
+
+    if isinstance(rule, int) and not isinstance(rule, bool):
+        return query.limit(rule)
+
+    if callable(rule) and not isinstance(rule, sa.sql.ClauseElement):
+        rule = rule(table)
+
+    return query.filter(rule)
+
+
+def _iter_referenced_rows(query, columns, values):
+
+    values = sorted(values)
+
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+
+        chunk = values[start:start + IN_CHUNK_SIZE]
+
+        if len(columns) == 1:
+            criterion = columns[0].in_([value[0] for value in chunk])
+        else:
+            criterion = sa.tuple_(*columns).in_(chunk)
+
+        for row in query.filter(criterion):
+            yield row
+
+
+class _TableRows(object):
+    """
+    The rows of a table to be dumped, without duplicates.
+    """
+
+    def __init__(self, table):
+
+        self.table = table
+        self.rows = []
+        self._identities = set()
+
+        primary_key = list(table.primary_key.columns)
+        self._identity_positions = _get_positions(table, primary_key) if primary_key else None
+
+    def _get_identity(self, row):
+
+        if self._identity_positions is None:
+            return tuple(row)
+
+        return tuple(row[position] for position in self._identity_positions)
+
+    def add(self, rows):
+        """
+        Add the rows which are not there yet, returning them.
+        """
+
+        added = []
+
+        for row in rows:
+            identity = self._get_identity(row)
+            if identity not in self._identities:
+                self._identities.add(identity)
+                added.append(row)
+
+        self.rows.extend(added)
+
+        return added
+
+    def get_missing(self, columns, values):
+        return values - _project(self.rows, _get_positions(self.table, columns))
+
+
+def _fetch_table(query, table, rule, required):
+    """
+    Return the rows of the table matching the rule, along with the ones with the ``required`` values, by referenced
+    columns, and the ones referenced by them through the self referencing foreign keys.
+    """
+
+    if rule is None:
+        return list(query(table))
+
+    table_rows = _TableRows(table)
+    added = table_rows.add(_apply_rule(query(table), table, rule))
+
+    self_references = [
+        ([element.parent for element in constraint.elements], [element.column for element in constraint.elements])
+        for constraint in table.foreign_key_constraints if constraint.referred_table is table
+    ]
+
+    pending = dict(required)
+
+    while pending:
+
+        for columns, values in pending.items():
+            missing = table_rows.get_missing(list(columns), values)
+            added.extend(table_rows.add(_iter_referenced_rows(query(table), list(columns), missing)))
+
+        pending = {}
+
+        for referencing, referenced in self_references:
+            values = _project(added, _get_positions(table, referencing))
+            if values:
+                pending[tuple(referenced)] = values
+
+        added = []
+
+    return table_rows.rows
+
+
+def _sort_rows(table, rows, order_by_column):
+
+    if order_by_column is None:
+        return rows
+
+    position = _get_positions(table, [order_by_column])[0]
+
+    return sorted(rows, key=lambda row: (row[position] is None, row[position]))
+
+
+def fetch_subset(query, tables, rules, get_order_by_column=lambda table: None):
+    """
+    Return the rows to dump of each table, by table name. ``query(table)`` returns the query of the rows of the table,
+    ``rules`` has the maximum number of rows or the predicate of the tables to subset, by table name, and the rows of
+    the subset tables are sorted by the column returned by ``get_order_by_column(table)``, if any.
+    """
+
+    unknown = sorted(set(rules) - set(table.name for table in tables))
+
+    if unknown:
+        raise ValueError('The tables {!r} to subset are not in the metadata.'.format(unknown))
+
+    # Table name: referenced columns: values of the columns referenced by the rows dumped.
+    required = collections.defaultdict(lambda: collections.defaultdict(set))
+    rows_by_table = {}
+
+    for table in reversed(tables):
+
+        rule = rules.get(table.name)
+        rows = _fetch_table(query, table, rule, required[table.name])
+
+        if rule is not None:
+            rows = _sort_rows(table, rows, get_order_by_column(table))
+
+        rows_by_table[table.name] = rows
+
+        for constraint in table.foreign_key_constraints:
+
+            parent = constraint.referred_table
+
+            if parent is table or parent.name not in rules:
+                continue
+
+            referencing = [element.parent for element in constraint.elements]
+            referenced = tuple(element.column for element in constraint.elements)
+
+            required[parent.name][referenced] |= _project(rows, _get_positions(table, referencing))
+
+    return rows_by_table
@@ -0,0 +1,49 @@
+"""
+Tracking of the tables accessed by the statements executed in the engines.
+"""
+from __future__ import unicode_literals
+
+import re
+
+from sqlalchemy import event
+
+
+def generate_table_regex(table_names):
+    """
+    Regex matching any of the table names as a whole identifier, quoted or not, in a SQL statement. A column with the
+    name of a table matches as well, which only means that table is restored without need.
+    """
+
+    # The longest names first, so a name is not matched by one of its prefixes.
+    names = sorted(table_names, key=len, reverse=True)
+
+    return re.compile(
+        r'(?<![\w$]){}(?![\w$])'.format(
+            '"?({})"?'.format('|'.join(re.escape(name) for name in names))
+        ),
+        re.IGNORECASE
+    )
+
+
+class TableAccessRecorder(object):
+    """
+    Context manager recording the tables referenced by the statements executed in the engines while it is active.
+    """
+
+    def __init__(self, tables, *engines):
+        self.engines = engines
+        self.accessed_tables = set()
+        self._names = {table.name.lower(): table.name for table in tables}
+        self._regex = generate_table_regex(self._names.values())
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.accessed_tables.update(self._names[name.lower()] for name in self._regex.findall(statement))
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
@@ -0,0 +1,94 @@
+"""
+Translation of the columnar dumps between dialects.
+
+The columnar dumps hold the values of the rows as Python objects, not as SQL literals of a dialect, so a dump captured
+on a dialect, e.g. PostgreSQL, is replayed on another one, e.g. an in memory SQLite, through the insert of each table
+and the bind processors of the target dialect.
+
+The column types without an equivalent on the target dialect, i.e. which its compiler can not render, are bound as
+their fallback type instead, e.g. an ``ARRAY`` as ``JSON``, the way the column is usually mapped with
+``with_variant``. The values of the ``ARRAY`` and ``JSON`` columns mapped to a string type are bound as ``JSON`` too.
+The other types raise :class:`DialectTranslationError`.
+"""
+from __future__ import unicode_literals
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+class DialectTranslationError(ValueError):
+    pass
+
+
+# Column type: type binding its values on the dialects without an equivalent. The first matching class is used.
+FALLBACK_TYPES = (
+    (sa.ARRAY, lambda: sa.JSON(none_as_null=True)),
+    (postgresql.HSTORE, lambda: sa.JSON(none_as_null=True)),
+    (postgresql.INET, sa.String),
+    (postgresql.CIDR, sa.String),
+    (postgresql.MACADDR, sa.String),
+)
+
+# The types whose values are serialized as JSON when the column is mapped to a string type on the target dialect.
+JSON_TYPES = (sa.ARRAY, sa.JSON, postgresql.HSTORE)
+
+
+def _compiles(type_, dialect):
+
+    try:
+        type_.compile(dialect=dialect)
+    except sa.exc.CompileError:
+        return False
+
+    return True
+
+
+def get_bind_type(column, dialect):
+    """
+    Return the type binding the values of the column on the dialect instead of the column type, or ``None`` when the
+    column type binds them itself.
+    """
+
+    impl = column.type.dialect_impl(dialect)
+
+    if _compiles(impl, dialect):
+        if isinstance(column.type, JSON_TYPES) and isinstance(impl, sa.String):
+            return sa.JSON(none_as_null=True)
+        return None
+
+    for column_type, fallback_type in FALLBACK_TYPES:
+        if isinstance(column.type, column_type) and _compiles(fallback_type(), dialect):
+            return fallback_type()
+
+    raise DialectTranslationError(
+        'The column {!r} of the table {!r}, of type {!r}, has no equivalent on {}. Map it to another type with '
+        '``with_variant``, or dump the test case on {}.'.format(
+            column.name, column.table.name, column.type, dialect.name, dialect.name
+        )
+    )
+
+
+def get_translated_insert(table, dialect):
+    """
+    Return the insert of the table binding the values of each column as their type on the dialect, along with the name
+    of the parameter of each column, by column key.
+    """
+
+    bind_types = {}
+
+    for column in table.columns:
+        bind_type = get_bind_type(column, dialect)
+        if bind_type is not None:
+            bind_types[column.key] = bind_type
+
+    # The names of the columns are reserved for the values taken straight from the parameters.
+    parameters = {key: 'translated_{}'.format(key) if key in bind_types else key for key in table.columns.keys()}
+
+    insert = table.insert()
+
+    if bind_types:
+        insert = insert.values({
+            key: sa.bindparam(parameters[key], type_=bind_type) for key, bind_type in bind_types.items()
+        })
+
+    return insert, parameters
@@ -0,0 +1,152 @@
+"""
+Tuning of the database session while a dump is restored.
+
+The rows of a test are disposable, so the durability settings of the database are relaxed while they are restored,
+e.g. ``synchronous_commit`` on PostgreSQL, and set back to their previous values right after. The tables restored can
+be analyzed afterwards, so the planner knows about their new rows.
+
+SQLite refuses to change its pragmas inside a transaction: they are only set when the restore starts outside of one,
+and set back when the connection is returned to the pool if the restore left a transaction open.
+"""
+from __future__ import unicode_literals
+
+import logging
+
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+# Dialect: (statement reading a setting, statement setting it).
+SETTING_STATEMENTS = {
+    'postgresql': ('SHOW {}', "SET LOCAL {} = '{}'"),
+    'sqlite': ('PRAGMA {}', 'PRAGMA {} = {}'),
+    'mysql': ('SELECT @@SESSION.{}', 'SET SESSION {} = {}'),
+}
+SETTING_STATEMENTS['mariadb'] = SETTING_STATEMENTS['mysql']
+
+# The settings of each dialect while restoring, as (name, value) pairs.
+PROFILES = {
+    'postgresql': (('synchronous_commit', 'off'),),
+    'sqlite': (('synchronous', 'OFF'), ('journal_mode', 'MEMORY')),
+    'mysql': (('unique_checks', '0'),),
+}
+PROFILES['mariadb'] = PROFILES['mysql']
+
+# ``ANALYZE TABLE`` commits the transaction on MySQL, so the tables are only analyzed on these dialects.
+ANALYZE_STATEMENTS = {
+    'postgresql': 'ANALYZE {}',
+    'sqlite': 'ANALYZE {}',
+}
+
+# The statements setting back the pragmas of the SQLite connections left in a transaction, by connection.
+_deferred_statements = {}
+
+
+def _get_driver_connection(connection):
+
+    connection_fairy = connection.connection
+
+    return getattr(connection_fairy, 'dbapi_connection', None) or connection_fairy.connection
+
+
+def _execute_deferred(dbapi_connection, connection_record):
+
+    statements = _deferred_statements.pop(id(dbapi_connection), None)
+
+    if statements is None or statements[0] is not dbapi_connection:
+        return
+
+    cursor = dbapi_connection.cursor()
+
+    try:
+        for statement in statements[1]:
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def _defer(engine, dbapi_connection, statements):
+
+    if not event.contains(engine, 'checkin', _execute_deferred):
+        event.listen(engine, 'checkin', _execute_deferred)
+
+    _deferred_statements[id(dbapi_connection)] = (dbapi_connection, statements)
+
+
+class RestoreTuning(object):
+    """
+    Context manager applying the settings, the profile of the dialect when ``settings`` is ``True``, to the connection
+    of the session while it is active. Nothing is changed when ``settings`` is empty or the dialect is not supported.
+    """
+
+    def __init__(self, dbsession, settings=True):
+        self.dbsession = dbsession
+        self.settings = settings
+        self.previous = []
+
+    def _get_settings(self, dialect):
+
+        if self.settings is True:
+            return PROFILES.get(dialect.name, ())
+
+        return tuple(dict(self.settings).items()) if self.settings else ()
+
+    def _in_sqlite_transaction(self, connection):
+        return connection.dialect.name == 'sqlite' and _get_driver_connection(connection).in_transaction
+
+    def __enter__(self):
+
+        connection = self.dbsession.connection()
+        settings = self._get_settings(connection.dialect)
+
+        if not settings or connection.dialect.name not in SETTING_STATEMENTS:
+            return self
+
+        if self._in_sqlite_transaction(connection):
+            logger.info('The pragmas of SQLite can not be changed inside a transaction, so the restore is not tuned.')
+            return self
+
+        get_statement, set_statement = SETTING_STATEMENTS[connection.dialect.name]
+        execute = getattr(connection, 'exec_driver_sql', connection.execute)
+
+        for name, value in settings:
+            self.previous.append((name, execute(get_statement.format(name)).scalar()))
+            execute(set_statement.format(name, value))
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        if not self.previous:
+            return
+
+        connection = self.dbsession.connection()
+        set_statement = SETTING_STATEMENTS[connection.dialect.name][1]
+        statements = [set_statement.format(name, value) for name, value in reversed(self.previous)]
+
+        if self._in_sqlite_transaction(connection):
+            _defer(connection.engine, _get_driver_connection(connection), statements)
+        else:
+            execute = getattr(connection, 'exec_driver_sql', connection.execute)
+            for statement in statements:
+                execute(statement)
+
+        self.previous = []
+
+
+def analyze_tables(dbsession, table_names):
+    """
+    Update the statistics of the planner about the tables, on the dialects where it does not end the transaction.
+    """
+
+    connection = dbsession.connection()
+    dialect = connection.dialect
+
+    if dialect.name not in ANALYZE_STATEMENTS or not table_names:
+        return
+
+    execute = getattr(connection, 'exec_driver_sql', connection.execute)
+
+    for name in table_names:
+        execute(ANALYZE_STATEMENTS[dialect.name].format(dialect.identifier_preparer.quote(name)))
@@ -2,7 +2,10 @@
 
 from __future__ import unicode_literals
 
+import hashlib
 import json
+import os
+import re
 import tempfile
 from datetime import date, timedelta, datetime
 
@@ -45,6 +48,79 @@ def generate_value_literal_compiler(dialect):
     return ValueLiteralCompiler
 
 
+STATEMENT_TABLE_REGEX = re.compile(r'^\s*INSERT INTO "((?:[^"]|"")+)"')
+
+# A statement up to its terminating semicolon, the semicolons and newlines inside the quoted strings and identifiers
+# being part of it. The quotes are escaped by doubling them, i.e. two adjacent quoted strings.
+STATEMENT_REGEX = re.compile(r'[^;\'"]*(?:(?:\'[^\']*\'|"[^"]*")[^;\'"]*)*;')
+
+STATEMENTS_BLOCK_SIZE = 1024 * 1024
+
+# The default ``repr`` of the objects, e.g. ``<foo.Bar object at 0x7f...>``.
+UNSTABLE_REPR_REGEX = re.compile(r' at 0x[0-9a-fA-F]+')
+
+CACHE_DIR_ENV_VAR = 'SQLALCHEMY_TEST_CACHE_DIR'
+DUMP_FILE_EXTENSION = '.dump'
+METADATA_FILE_EXTENSION = '.meta'
+
+
+def get_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV_VAR) or tempfile.gettempdir()
+
+
+def generate_class_key(klass):
+    # ``id(klass)`` changes on every interpreter run, so the key is derived from the class location instead,
+    # allowing dumps to be built by one process (e.g. the command line tool) and loaded by another.
+    location = '{}.{}'.format(klass.__module__, klass.__name__)
+    return hashlib.sha1(location.encode('utf-8')).hexdigest()[:12]
+
+
+def generate_test_key(klass, function_name, arguments_key=None):
+    """
+    Key of the dump of the method of the class, called with the arguments of ``arguments_key`` when given.
+    """
+
+    location = '{}.{}.{}'.format(klass.__module__, klass.__name__, function_name)
+
+    if arguments_key is not None:
+        location = '{}:{}'.format(location, arguments_key)
+
+    return hashlib.sha1(location.encode('utf-8')).hexdigest()[:12]
+
+
+def _get_stable_repr(value):
+    """
+    ``repr`` of the value with the items of the dicts and sets sorted, as their order may change between runs.
+    """
+
+    if isinstance(value, dict):
+        return '{{{}}}'.format(', '.join(sorted(
+            '{}: {}'.format(_get_stable_repr(key), _get_stable_repr(item)) for key, item in value.items()
+        )))
+
+    if isinstance(value, (set, frozenset)):
+        return '{}({})'.format(type(value).__name__, ', '.join(sorted(_get_stable_repr(item) for item in value)))
+
+    if isinstance(value, (list, tuple)):
+        return '{}[{}]'.format(type(value).__name__, ', '.join(_get_stable_repr(item) for item in value))
+
+    return repr(value)
+
+
+def generate_arguments_key(args, kwargs):
+    """
+    Hash of the arguments stable across interpreter runs, or ``None`` when any of them is represented by its address,
+    e.g. an object without a ``__repr__``, whose representation changes on every run.
+    """
+
+    representation = _get_stable_repr((tuple(args), kwargs))
+
+    if UNSTABLE_REPR_REGEX.search(representation):
+        return None
+
+    return hashlib.sha1(representation.encode('utf-8')).hexdigest()[:12]
+
+
 def generate_dump_path(class_name, class_id, use_tmp=True, basedir=None):
 
     if basedir and use_tmp:
@@ -59,22 +135,84 @@ def generate_dump_path(class_name, class_id, use_tmp=True, basedir=None):
             'use_tmp', False
         ))
 
-    return '{}/{}-{}.dump'.format(basedir or tempfile.gettempdir(), class_name, class_id)
+    return '{}/{}-{}{}'.format(basedir or get_cache_dir(), class_name, class_id, DUMP_FILE_EXTENSION)
 
 
-def load_dump_data_from_file(dump_file_path):
+def generate_layer_path(layer_name, basedir=None):
+    return '{}/layer-{}{}'.format(basedir or get_cache_dir(), layer_name, DUMP_FILE_EXTENSION)
 
-    with open(dump_file_path) as f:
+
+def generate_metadata_path(dump_file_path):
+    return '{}{}'.format(dump_file_path, METADATA_FILE_EXTENSION)
+
+
+def read_dump_metadata(dump_file_path):
+
+    try:
+        with open(generate_metadata_path(dump_file_path)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_dump_metadata(dump_file_path, metadata):
+    with open(generate_metadata_path(dump_file_path), 'w') as f:
+        json.dump(metadata, f, sort_keys=True)
+
+
+def generate_dump_checksum(dump_data):
+
+    if not isinstance(dump_data, bytes):
+        dump_data = dump_data.encode('utf-8')
+
+    return hashlib.sha1(dump_data).hexdigest()
+
+
+def get_statement_table(statement):
+
+    match = STATEMENT_TABLE_REGEX.match(statement)
+
+    return match.group(1).replace('""', '"') if match else None
+
+
+def iter_statements(f, block_size=STATEMENTS_BLOCK_SIZE):
+    """
+    Yield the statements of the file object, read in blocks of ``block_size`` characters, each one stripped of the
+    whitespace before it. The text after the last statement, if any, is yielded as is.
+    """
+
+    buffer = ''
+
+    while True:
+
+        block = f.read(block_size)
+        buffer += block
+        position = 0
 
         while True:
 
-            data = f.readline()
+            match = STATEMENT_REGEX.match(buffer, position)
 
-            if not data:
+            if match is None:
                 break
 
-            else:
-                yield data
+            yield match.group().lstrip()
+            position = match.end()
+
+        buffer = buffer[position:]
+
+        if not block:
+            break
+
+    if buffer.strip():
+        yield buffer
+
+
+def load_dump_data_from_file(dump_file_path):
+
+    with open(dump_file_path) as f:
+        for statement in iter_statements(f):
+            yield statement
 
 
 def write_dump_data_to_file(dump_file_path, dump_data):
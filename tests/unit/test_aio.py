@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_aio
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.aio` module.
+"""
+from __future__ import unicode_literals
+
+import collections
+import sys
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+try:
+    import asyncio
+    from sqlalchemy_test_cache import aio
+except (ImportError, SyntaxError):  # python2 or SQLAlchemy without asyncio support
+    aio = None
+
+
+FakeColumn = collections.namedtuple('FakeColumn', ('name', 'type'))
+
+
+class FakeTable(object):
+
+    def __init__(self, name=None, columns=None):
+        self.name = name or 'faketable'
+        self.columns = columns or {}
+
+    def __str__(self):
+        return self.name
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def create_async_session(driver='aiosqlite'):
+
+    connection = mock.AsyncMock()
+    connection.dialect.driver = driver
+
+    dbsession = mock.AsyncMock()
+    dbsession.connection.return_value = connection
+
+    return dbsession, connection
+
+
+@unittest.skipIf(aio is None or sys.version_info < (3, 8), 'requires python 3.8 and SQLAlchemy 1.4')
+class AsyncDumpManagerTestCase(unittest.TestCase):
+
+    def test_iter_batches(self):
+
+        dm = aio.AsyncDumpManager(base_model=mock.Mock(), dbsession=mock.Mock(), batch_size=2)
+
+        batches = list(dm._iter_batches(['INSERT 1;\n', '\n', 'INSERT 2;\n', 'INSERT 3;\n']))
+
+        self.assertListEqual(batches, [['INSERT 1;', 'INSERT 2;'], ['INSERT 3;']])
+
+    def test_dump_streams_the_rows(self):
+
+        table = FakeTable(columns=collections.OrderedDict((
+            ('name', FakeColumn('name', str)), ('age', FakeColumn('age', int))
+        )))
+
+        result = mock.MagicMock()
+        result.partitions.return_value.__aiter__.return_value = [[('Name1', 23), ('Name2', 24)], [('Name3', 25)]]
+
+        dbsession = mock.Mock()
+        dbsession.stream = mock.AsyncMock(return_value=result)
+
+        dm = aio.AsyncDumpManager(base_model=mock.Mock(), dbsession=dbsession, fetch_size=2)
+
+        with mock.patch.object(dm, '_get_table_select') as select_patched:
+            with mock.patch.object(dm, '_dump_row_values', side_effect=lambda row, columns, dialect: [repr(v) for v in row]):
+                statements = run(dm.dump(table))
+
+        dbsession.stream.assert_awaited_once_with(select_patched.return_value)
+        result.partitions.assert_called_once_with(2)
+
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(statements[2], 'INSERT INTO "faketable" (name, age) VALUES (\'Name3\', 25);')
+        self.assertEqual(dm.table_stats['faketable']['rows'], 3)
+
+    def test_loads_statement_by_statement(self):
+
+        dbsession, connection = create_async_session()
+
+        dm = aio.AsyncDumpManager(base_model=mock.Mock(), dbsession=dbsession, batch_size=2)
+
+        run(dm.loads(iter(['INSERT 1;\n', 'INSERT 2;\n', 'INSERT 3;\n'])))
+
+        connection.exec_driver_sql.assert_has_calls([
+            mock.call('INSERT 1;'), mock.call('INSERT 2;'), mock.call('INSERT 3;')
+        ])
+        self.assertTrue(dbsession.flush.called)
+
+    def test_loads_script_per_batch(self):
+
+        dbsession, connection = create_async_session(driver='asyncpg')
+
+        raw_connection = mock.Mock()
+        raw_connection.driver_connection = mock.AsyncMock()
+        connection.get_raw_connection.return_value = raw_connection
+
+        dm = aio.AsyncDumpManager(base_model=mock.Mock(), dbsession=dbsession, batch_size=2)
+
+        run(dm.loads(iter(['INSERT 1;\n', 'INSERT 2;\n', 'INSERT 3;\n'])))
+
+        connection.exec_driver_sql.assert_called_once_with('SELECT 1')
+        raw_connection.driver_connection.execute.assert_has_calls([
+            mock.call('INSERT 1;\nINSERT 2;'), mock.call('INSERT 3;')
+        ])
+        self.assertTrue(dbsession.flush.called)
+
+
+@unittest.skipIf(aio is None or sys.version_info < (3, 8), 'requires python 3.8 and SQLAlchemy 1.4')
+class AsyncCacheSqlTestCase(unittest.TestCase):
+
+    @mock.patch('sqlalchemy_test_cache.aio.AsyncDumpManager')
+    @mock.patch('sqlalchemy_test_cache.aio.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_dump_if_dump_file_does_not_exists(self, write_patched, metadata_patched, exists_patched,
+                                                     manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables = mock.AsyncMock(return_value=['INSERT 1;', 'INSERT 2;'])
+
+        fake_test_function = mock.AsyncMock(return_value=42)
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        result = run(aio.async_cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched))
+
+        self.assertEqual(result, 42)
+        fake_test_function.assert_awaited_once_with(self_patched)
+        self.assertEqual(write_patched.call_args[0][1], 'INSERT 1;\nINSERT 2;')
+
+    @mock.patch('sqlalchemy_test_cache.aio.AsyncDumpManager')
+    @mock.patch('sqlalchemy_test_cache.aio.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.aio.load_dump_data_from_file')
+    def test_loads_from_file_when_dump_file_exists(self, load_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        load_patched.return_value = ['INSERT 1;\n']
+        manager_patched.return_value.loads = mock.AsyncMock()
+
+        fake_test_function = mock.AsyncMock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        run(aio.async_cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched))
+
+        self.assertFalse(fake_test_function.called)
+        manager_patched.return_value.loads.assert_awaited_once_with(['INSERT 1;\n'])
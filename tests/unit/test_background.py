@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_background
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.background` module.
+"""
+from __future__ import unicode_literals
+
+import threading
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+from sqlalchemy_test_cache.background import BackgroundWriter
+
+
+class BackgroundWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('sqlalchemy_test_cache.background.atexit')
+        self.atexit_patched = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_tasks_in_order(self):
+
+        writer = BackgroundWriter()
+        written = []
+
+        writer.submit('/tmp/First.dump', written.append, 'first')
+        writer.submit('/tmp/Second.dump', written.append, 'second')
+        writer.flush()
+
+        self.assertListEqual(written, ['first', 'second'])
+        self.atexit_patched.register.assert_called_once_with(writer.flush)
+
+    def test_pending_until_written(self):
+
+        writer = BackgroundWriter()
+        event = threading.Event()
+
+        writer.submit('/tmp/First.dump', event.wait)
+
+        self.assertTrue(writer.is_pending('/tmp/First.dump'))
+        self.assertFalse(writer.is_pending('/tmp/Second.dump'))
+
+        event.set()
+        writer.wait('/tmp/First.dump')
+
+        self.assertFalse(writer.is_pending('/tmp/First.dump'))
+
+    def test_keep_running_after_failure(self):
+
+        writer = BackgroundWriter()
+        written = []
+
+        with mock.patch('sqlalchemy_test_cache.background.logger') as logger_patched:
+            writer.submit('/tmp/First.dump', mock.Mock(side_effect=IOError))
+            writer.submit('/tmp/Second.dump', written.append, 'second')
+            writer.flush()
+
+        self.assertTrue(logger_patched.exception.called)
+        self.assertFalse(writer.is_pending('/tmp/First.dump'))
+        self.assertListEqual(written, ['second'])
+
+    def test_wait_without_pending_dumps(self):
+
+        writer = BackgroundWriter()
+
+        with mock.patch.object(writer, 'flush') as flush_patched:
+            writer.wait('/tmp/First.dump')
+
+        self.assertFalse(flush_patched.called)
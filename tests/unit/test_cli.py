@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cli
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.cli` module.
+"""
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+from sqlalchemy_test_cache import cli, columnar, storage, utils
+from sqlalchemy_test_cache.decorator import cache_sql
+
+
+class CachedTestCase(unittest.TestCase):
+
+    @cache_sql(None, None)
+    def _cache_objects(self):
+        pass
+
+    def test_something(self):
+        pass
+
+
+class NotCachedTestCase(unittest.TestCase):
+
+    def test_something(self):
+        pass
+
+
+def create_dump(cache_dir, name, dump_data, metadata=None):
+
+    path = os.path.join(cache_dir, name)
+
+    utils.write_dump_data_to_file(path, dump_data)
+
+    if metadata is not None:
+        utils.write_dump_metadata(path, metadata)
+
+    return path
+
+
+class IsCachedTestCaseTestCase(unittest.TestCase):
+
+    def test_test_case_with_decorated_method(self):
+        self.assertTrue(cli.is_cached_test_case(CachedTestCase))
+
+    def test_test_case_without_decorated_method(self):
+        self.assertFalse(cli.is_cached_test_case(NotCachedTestCase))
+
+
+class IterTestsTestCase(unittest.TestCase):
+
+    def test_flatten_nested_suites(self):
+
+        test1, test2 = CachedTestCase('test_something'), NotCachedTestCase('test_something')
+
+        suite = unittest.TestSuite([unittest.TestSuite([test1]), unittest.TestSuite([unittest.TestSuite([test2])])])
+
+        self.assertListEqual(list(cli.iter_tests(suite)), [test1, test2])
+
+
+class BuildTestCase(unittest.TestCase):
+
+    @mock.patch('sqlalchemy_test_cache.cli.discover_cached_tests')
+    def test_nothing_to_build(self, discover_patched):
+
+        discover_patched.return_value = {}
+
+        stream = io.StringIO()
+
+        self.assertEqual(cli.build('tests', stream=stream), 0)
+        self.assertIn('No cached test cases were found', stream.getvalue())
+
+    @mock.patch('sqlalchemy_test_cache.cli.multiprocessing.Pool')
+    @mock.patch('sqlalchemy_test_cache.cli.discover_cached_tests')
+    def test_build_each_test_case_in_the_pool(self, discover_patched, pool_patched):
+
+        discover_patched.return_value = {'tests.FooTestCase': ['tests.FooTestCase.test_foo']}
+        pool_patched.return_value.imap_unordered.return_value = [cli.BuildResult('tests.FooTestCase', 1, 1)]
+
+        stream = io.StringIO()
+
+        self.assertEqual(cli.build('tests', jobs=4, stream=stream), 1)
+
+        pool_patched.assert_called_once_with(processes=1)
+        self.assertEqual(
+            pool_patched.return_value.imap_unordered.call_args[0][1],
+            [('tests.FooTestCase', ['tests.FooTestCase.test_foo'], os.path.abspath('tests'))]
+        )
+        self.assertIn('FAILED tests.FooTestCase (1 tests)', stream.getvalue())
+
+
+class ListEntriesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_list_size_and_hits(self):
+
+        create_dump(self.cache_dir, 'FooTestCase-123.dump', 'INSERT INTO "foo" ...', metadata={'hits': 7})
+        create_dump(self.cache_dir, 'BarTestCase-123.dump', 'INSERT INTO "bar" ...')
+
+        stream = io.StringIO()
+
+        cli.list_entries(self.cache_dir, stream=stream)
+
+        lines = stream.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('BarTestCase-123.dump'))
+        self.assertTrue(lines[1].endswith(' -'))
+        self.assertTrue(lines[2].startswith('FooTestCase-123.dump'))
+        self.assertIn('21B', lines[2])
+        self.assertTrue(lines[2].endswith(' 7'))
+
+
+class VerifyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_valid_entry(self):
+
+        dump_data = 'INSERT INTO "foo" ...'
+
+        path = create_dump(self.cache_dir, 'FooTestCase-123.dump', dump_data, metadata={
+            'checksum': utils.generate_dump_checksum(dump_data)
+        })
+
+        self.assertIsNone(cli.verify_entry(path))
+
+    def test_entry_without_metadata(self):
+
+        path = create_dump(self.cache_dir, 'FooTestCase-123.dump', 'INSERT INTO "foo" ...')
+
+        self.assertEqual(cli.verify_entry(path), 'missing metadata')
+
+    def test_entry_with_wrong_checksum(self):
+
+        path = create_dump(self.cache_dir, 'FooTestCase-123.dump', 'INSERT INTO "foo" ...', metadata={
+            'checksum': utils.generate_dump_checksum('INSERT INTO "bar" ...')
+        })
+
+        self.assertEqual(cli.verify_entry(path), 'checksum mismatch')
+
+    def test_chunked_entry(self):
+
+        path = os.path.join(self.cache_dir, 'FooTestCase-123.dump')
+
+        manifest_data = storage.write_chunked_dump(path, ['INSERT INTO "foo" ...', 'INSERT INTO "bar" ...'])
+        utils.write_dump_metadata(path, {'checksum': utils.generate_dump_checksum(manifest_data), 'format': 'chunked'})
+
+        self.assertIsNone(cli.verify_entry(path))
+
+        os.unlink(storage.generate_chunk_path(storage.read_manifest(path)['chunks'][1][1], self.cache_dir))
+
+        self.assertEqual(cli.verify_entry(path), "missing chunk of 'bar'")
+
+    def test_columnar_entry(self):
+
+        path = os.path.join(self.cache_dir, 'FooTestCase-123.dump')
+
+        dump_data = columnar.encode_dump([columnar.encode_table('foo', ['id'], [(1,), (2,)])])
+        columnar.write_columnar_dump(path, dump_data)
+        utils.write_dump_metadata(path, {'checksum': utils.generate_dump_checksum(dump_data), 'format': 'columnar'})
+
+        self.assertIsNone(cli.verify_entry(path))
+
+    def test_delete_invalid_entries(self):
+
+        path = create_dump(self.cache_dir, 'FooTestCase-123.dump', 'DROP TABLE "foo";', metadata={
+            'checksum': utils.generate_dump_checksum('DROP TABLE "foo";')
+        })
+
+        stream = io.StringIO()
+
+        self.assertEqual(cli.verify(self.cache_dir, delete=True, stream=stream), 1)
+
+        self.assertIn('INVALID FooTestCase-123.dump', stream.getvalue())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(utils.generate_metadata_path(path)))
+
+
+class MainTestCase(unittest.TestCase):
+
+    @mock.patch('sqlalchemy_test_cache.cli.os.makedirs')
+    @mock.patch('sqlalchemy_test_cache.cli.list_entries')
+    def test_cache_dir_option_is_exported(self, list_patched, makedirs_patched):
+
+        with mock.patch.dict(os.environ, clear=True):
+            cli.main(['--cache-dir', '/foobar', 'list'])
+
+            self.assertEqual(os.environ[utils.CACHE_DIR_ENV_VAR], '/foobar')
+
+        list_patched.assert_called_once_with('/foobar')
+        makedirs_patched.assert_called_once_with('/foobar')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_columnar
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.columnar` module.
+"""
+from __future__ import unicode_literals
+
+import datetime
+import decimal
+import io
+import unittest
+
+from sqlalchemy_test_cache import columnar
+
+
+class EncodingTestCase(unittest.TestCase):
+
+    def test_get_encoding(self):
+
+        self.assertEqual(columnar.get_encoding([1, None, 2 ** 40]), 'int64')
+        self.assertEqual(columnar.get_encoding([2 ** 64]), 'pickle')
+        self.assertEqual(columnar.get_encoding([True, None]), 'bool')
+        self.assertEqual(columnar.get_encoding([1.5]), 'float64')
+        self.assertEqual(columnar.get_encoding([datetime.datetime(2016, 11, 16, 10, 30)]), 'datetime')
+        self.assertEqual(columnar.get_encoding([datetime.date(2016, 11, 16)]), 'date')
+        self.assertEqual(columnar.get_encoding(['Name', 'Ção']), 'text')
+        self.assertEqual(columnar.get_encoding([b'\x00\xff']), 'bytes')
+        self.assertEqual(columnar.get_encoding([decimal.Decimal('1.5')]), 'pickle')
+
+    def test_encode_and_decode_columns(self):
+
+        columns = [
+            [1, None, -2 ** 63],
+            [True, False, None],
+            [0.5, None, -1e300],
+            [datetime.datetime(1900, 1, 1, 0, 0, 0, 1), None, datetime.datetime(2016, 11, 16, 10, 30)],
+            [datetime.date(1, 1, 1), datetime.date(2016, 11, 16), None],
+            ['', None, 'Ção\n\'"'],
+            [b'\x00', b'', None],
+            [decimal.Decimal('1.5'), {'a': [1]}, None],
+            [None, None, None],
+        ]
+
+        for values in columns:
+            encoding, nulls, data = columnar.encode_column(values)
+            self.assertListEqual(columnar.decode_column(encoding, len(values), nulls, data), values)
+
+    def test_no_nulls_bitmap_without_nulls(self):
+
+        encoding, nulls, data = columnar.encode_column([1, 2, 3])
+
+        self.assertEqual(nulls, b'')
+        self.assertEqual(len(data), 24)
+
+
+class ColumnarDumpTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.dump_data = columnar.encode_dump([
+            columnar.encode_table('user', ['id', 'name'], [(1, 'Name1'), (2, None)]),
+            columnar.encode_table('address', ['id'], []),
+            columnar.encode_table('log', ['id'], [(1,)]),
+        ])
+
+    def test_iter_columnar_dump(self):
+
+        self.assertListEqual(list(columnar.iter_columnar_dump(io.BytesIO(self.dump_data))), [
+            ('user', ['id', 'name'], [(1, 'Name1'), (2, None)]),
+            ('address', ['id'], []),
+            ('log', ['id'], [(1,)]),
+        ])
+
+    def test_iter_columnar_dump_of_given_tables(self):
+
+        self.assertListEqual(list(columnar.iter_columnar_dump(io.BytesIO(self.dump_data), tables={'log'})), [
+            ('log', ['id'], [(1,)]),
+        ])
+
+    def test_iter_invalid_dump(self):
+
+        with self.assertRaises(ValueError):
+            list(columnar.iter_columnar_dump(io.BytesIO(b'INSERT INTO "user" (id) VALUES (1);')))
@@ -14,7 +14,10 @@ try:
 except ImportError:  # python2
     import mock
 
+from sqlalchemy_test_cache import decorator
 from sqlalchemy_test_cache.decorator import cache_sql
+from sqlalchemy_test_cache.translation import DialectTranslationError
+from sqlalchemy_test_cache.utils import generate_arguments_key, generate_dump_checksum, generate_test_key
 
 
 class FakeDumpManager(object):
@@ -57,11 +60,68 @@ class DecoratorTestCase(unittest.TestCase):
         decorated_test_case(self_patched)
 
         self.assertTrue(generate_patched.called)
-        generate_patched.assert_called_once_with('FakeTestCase', id(self_patched.__class__))
+        generate_patched.assert_called_once_with(
+            'FakeTestCase.test_fake', generate_test_key(self_patched.__class__, 'test_fake')
+        )
 
         self.assertTrue(exists_patched.called)
         exists_patched.assert_called_once_with('/tmp/FakeTestCase.dump')
 
+    @mock.patch('sqlalchemy_test_cache.decorator.generate_dump_path')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_dump_path_using_arguments(self, load_patched, exists_patched, manager_patched, generate_patched):
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(None, None)(fake_test_function)(self_patched, 1, name='first')
+
+        generate_patched.assert_called_once_with('FakeTestCase.test_fake', generate_test_key(
+            self_patched.__class__, 'test_fake', generate_arguments_key((1,), {'name': 'first'})
+        ))
+
+    @mock.patch('sqlalchemy_test_cache.decorator.generate_dump_path')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_dump_path_shared_by_arguments(self, load_patched, exists_patched, manager_patched, generate_patched):
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(None, None, share_arguments=True)(fake_test_function)(self_patched, 1, name='first')
+
+        generate_patched.assert_called_once_with(
+            'FakeTestCase.test_fake', generate_test_key(self_patched.__class__, 'test_fake')
+        )
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    def test_not_cached_with_unstable_arguments(self, exists_patched, manager_patched):
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        argument = object()
+
+        result = cache_sql(None, None)(fake_test_function)(self_patched, argument)
+
+        self.assertIs(result, fake_test_function.return_value)
+        fake_test_function.assert_called_once_with(self_patched, argument)
+        exists_patched.assert_not_called()
+        manager_patched.assert_not_called()
+
     @mock.patch('sqlalchemy_test_cache.decorator.generate_dump_path')
     @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
     @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
@@ -86,8 +146,10 @@ class DecoratorTestCase(unittest.TestCase):
 
     @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
     @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
     @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
-    def test_write_dump_to_file_if_dump_file_does_not_exists(self, write_patched, exists_patched, manager_patched):
+    def test_write_dump_to_file_if_dump_file_does_not_exists(self, write_patched, metadata_patched, exists_patched,
+                                                             manager_patched):
 
         exists_patched.return_value = False
 
@@ -108,7 +170,9 @@ class DecoratorTestCase(unittest.TestCase):
         fake_test_function.assert_called_once_with(self_patched)
 
         self.assertTrue(write_patched.called)
-        write_patched.assert_called_once_with('/tmp/FakeTestCase-{}.dump'.format(id(self_patched.__class__)), '')
+        write_patched.assert_called_once_with(
+            '/tmp/FakeTestCase.test_fake-{}.dump'.format(generate_test_key(self_patched.__class__, 'test_fake')), ''
+        )
 
     @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
     @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
@@ -138,7 +202,839 @@ class DecoratorTestCase(unittest.TestCase):
         self.assertTrue(manager_patched.called)
 
         self.assertTrue(load_dump_patched.called)
-        load_dump_patched.assert_called_once_with('/tmp/FakeTestCase-{}.dump'.format(id(self_patched.__class__)))
+        load_dump_patched.assert_called_once_with(
+            '/tmp/FakeTestCase.test_fake-{}.dump'.format(generate_test_key(self_patched.__class__, 'test_fake'))
+        )
 
         self.assertTrue(dump_manager_loads_patched.loads.called)
         dump_manager_loads_patched.loads.assert_called_once_with(['INSERT INTO "faketable" ...\n'])
+
+    def test_decorated_function_is_marked(self):
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        decorated_test_case = cache_sql(None, None)(fake_test_function)
+
+        self.assertTrue(decorated_test_case.cache_sql)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_metadata_if_dump_file_does_not_exists(self, write_patched, metadata_patched, exists_patched,
+                                                         manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = ['INSERT INTO "a" ...', 'INSERT INTO "b" ...']
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        decorated_test_case = cache_sql(mock.Mock(), mock.Mock())(fake_test_function)
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        decorated_test_case(self_patched)
+
+        self.assertTrue(metadata_patched.called)
+
+        metadata = metadata_patched.call_args[0][1]
+
+        self.assertEqual(metadata['function'], 'test_fake')
+        self.assertEqual(metadata['statements'], 2)
+        self.assertEqual(metadata['hits'], 0)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_increment_hits_when_dump_file_exists(self, write_metadata_patched, read_metadata_patched, *mocks):
+
+        read_metadata_patched.return_value = {'hits': 2}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        decorated_test_case = cache_sql(mock.Mock(), mock.Mock())(fake_test_function)
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        decorated_test_case(self_patched)
+
+        self.assertFalse(fake_test_function.called)
+        self.assertEqual(write_metadata_patched.call_args[0][1]['hits'], 3)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.metrics.emit')
+    def test_emit_miss_event(self, emit_patched, write_patched, metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = []
+        manager_patched.return_value.table_stats = {'faketable': {'rows': 0, 'bytes': 0}}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        event = emit_patched.call_args[0][0]
+
+        self.assertFalse(event.hit)
+        self.assertTrue(event.test.endswith('.FakeTestCase.test_fake'))
+        self.assertIsNotNone(event.test_time)
+        self.assertIsNotNone(event.dump_time)
+        self.assertIsNone(event.restore_time)
+        self.assertEqual(event.tables, {'faketable': {'rows': 0, 'bytes': 0}})
+
+        self.assertEqual(metadata_patched.call_args[0][1]['test_time'], event.test_time)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.metrics.emit')
+    def test_emit_hit_event(self, emit_patched, write_metadata_patched, read_metadata_patched, *mocks):
+
+        read_metadata_patched.return_value = {'test_time': 10.0, 'tables': {'faketable': {'rows': 1, 'bytes': 42}}}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        event = emit_patched.call_args[0][0]
+
+        self.assertTrue(event.hit)
+        self.assertEqual(event.test_time, 10.0)
+        self.assertIsNotNone(event.restore_time)
+        self.assertEqual(event.tables, {'faketable': {'rows': 1, 'bytes': 42}})
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_chunked_dump')
+    def test_write_chunked_dump_when_deduplicating(self, write_patched, metadata_patched, exists_patched,
+                                                   manager_patched):
+
+        exists_patched.return_value = False
+        write_patched.return_value = '{"chunks": []}'
+        manager_patched.return_value.dump_all_tables.return_value = ['INSERT INTO "a" ...']
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), deduplicate=True)(fake_test_function)(self_patched)
+
+        write_patched.assert_called_once_with(mock.ANY, ['INSERT INTO "a" ...'])
+
+        metadata = metadata_patched.call_args[0][1]
+
+        self.assertEqual(metadata['format'], 'chunked')
+        self.assertEqual(metadata['checksum'], generate_dump_checksum('{"chunks": []}'))
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_chunked_dump')
+    def test_loads_chunked_dump(self, load_patched, write_metadata_patched, read_metadata_patched, exists_patched,
+                                manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'format': 'chunked'}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        self.assertTrue(load_patched.called)
+        manager_patched.return_value.loads.assert_called_once_with(load_patched.return_value)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.TableAccessRecorder')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_accessed_tables(self, write_patched, metadata_patched, exists_patched, manager_patched,
+                                   recorder_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = []
+        recorder_patched.return_value.__enter__.return_value.accessed_tables = {'user', 'address'}
+
+        dbsession = mock.Mock()
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), dbsession, only_accessed_tables=True)(fake_test_function)(self_patched)
+
+        recorder_patched.assert_called_once_with(manager_patched.return_value.tables, dbsession.get_bind.return_value)
+        self.assertListEqual(metadata_patched.call_args[0][1]['accessed_tables'], ['address', 'user'])
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_loads_only_accessed_tables(self, write_metadata_patched, read_metadata_patched, load_patched, exists_patched,
+                                        manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'accessed_tables': ['address']}
+        manager_patched.return_value.get_required_tables.return_value = {'address', 'user'}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), only_accessed_tables=True)(fake_test_function)(self_patched)
+
+        manager_patched.return_value.get_required_tables.assert_called_once_with(['address'])
+        manager_patched.return_value.loads.assert_called_once_with(load_patched.return_value, tables={'address', 'user'})
+
+    @mock.patch('sqlalchemy_test_cache.decorator.record_instances')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_rehydrated_instances(self, write_patched, metadata_patched, exists_patched, manager_patched,
+                                        record_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = []
+        record_patched.return_value = {'user': {'many': False, 'instances': [['models.User', [1]]]}}
+
+        dbsession = mock.Mock()
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), dbsession, rehydrate=True)(fake_test_function)(self_patched)
+
+        dbsession.flush.assert_called_once_with()
+        record_patched.assert_called_once_with(self_patched)
+        self.assertDictEqual(metadata_patched.call_args[0][1]['instances'], record_patched.return_value)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.rehydrate_instances')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_rehydrate_instances_after_restore(self, write_metadata_patched, read_metadata_patched, load_patched,
+                                               exists_patched, manager_patched, rehydrate_patched):
+
+        exists_patched.return_value = True
+        instances = {'user': {'many': False, 'instances': [['models.User', [1]]]}}
+        read_metadata_patched.return_value = {'instances': instances}
+
+        dbsession = mock.Mock()
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), dbsession, rehydrate=True)(fake_test_function)(self_patched)
+
+        fake_test_function.assert_not_called()
+        manager_patched.return_value.loads.assert_called_once_with(load_patched.return_value)
+        rehydrate_patched.assert_called_once_with(self_patched, dbsession, instances)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_reset_before_restore(self, write_metadata_patched, read_metadata_patched, load_patched, exists_patched,
+                                  manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), reset=True)(fake_test_function)(self_patched)
+
+        self.assertListEqual(manager_patched.return_value.method_calls[:2], [
+            mock.call.reset(), mock.call.loads(load_patched.return_value)
+        ])
+
+    @mock.patch('sqlalchemy_test_cache.decorator.analyze_tables')
+    @mock.patch('sqlalchemy_test_cache.decorator.RestoreTuning')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_tune_and_analyze_restore(self, write_metadata_patched, read_metadata_patched, load_patched, exists_patched,
+                                      manager_patched, tuning_patched, analyze_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'tables': {'user': {'rows': 2, 'bytes': 80}, 'log': {'rows': 0, 'bytes': 0}}}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), tuning=True, analyze=True)(fake_test_function)(self_patched)
+
+        dm = manager_patched.return_value
+
+        tuning_patched.assert_called_once_with(dm.dbsession, True)
+        self.assertTrue(tuning_patched.return_value.__enter__.called)
+        dm.loads.assert_called_once_with(load_patched.return_value)
+        analyze_patched.assert_called_once_with(dm.dbsession, ['user'])
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_columnar_dump')
+    def test_write_columnar_dump(self, write_patched, metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables_columnar.return_value = [b'block1', b'block2']
+        manager_patched.return_value.table_stats = {'a': {'rows': 2, 'bytes': 6}, 'b': {'rows': 1, 'bytes': 6}}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), dump_format='columnar')(fake_test_function)(self_patched)
+
+        dump_data = write_patched.call_args[0][1]
+
+        self.assertTrue(dump_data.endswith(b'block1block2'))
+
+        metadata = metadata_patched.call_args[0][1]
+
+        self.assertEqual(metadata['format'], 'columnar')
+        self.assertEqual(metadata['statements'], 3)
+        self.assertEqual(metadata['checksum'], generate_dump_checksum(dump_data))
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_columnar_dump')
+    def test_loads_columnar_dump(self, load_patched, write_metadata_patched, read_metadata_patched, exists_patched,
+                                 manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'format': 'columnar'}
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        load_patched.assert_called_once_with(mock.ANY, None)
+        manager_patched.return_value.loads_columnar.assert_called_once_with(load_patched.return_value, translate=False)
+        self.assertFalse(manager_patched.return_value.loads.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_columnar_dump')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    def test_loads_columnar_dump_of_another_dialect(self, write_metadata_patched, read_metadata_patched, load_patched,
+                                                    exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'format': 'columnar', 'dialect': 'postgresql'}
+        manager_patched.return_value.dbsession.bind.dialect.name = 'sqlite'
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        manager_patched.return_value.loads_columnar.assert_called_once_with(load_patched.return_value, translate=True)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    def test_sql_dump_of_another_dialect(self, read_metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'dialect': 'postgresql'}
+        manager_patched.return_value.dbsession.bind.dialect.name = 'sqlite'
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        with self.assertRaises(DialectTranslationError):
+            cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        self.assertFalse(manager_patched.return_value.loads.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_dialect(self, write_patched, metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = []
+        manager_patched.return_value.dbsession.bind.dialect.name = 'postgresql'
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        self.assertEqual(metadata_patched.call_args[0][1]['dialect'], 'postgresql')
+
+    def test_invalid_dump_format(self):
+
+        with self.assertRaises(ValueError):
+            cache_sql(None, None, dump_format='arrow')
+
+        with self.assertRaises(ValueError):
+            cache_sql(None, None, dump_format='columnar', deduplicate=True)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.writer')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_write_dump_in_background(self, write_patched, metadata_patched, exists_patched, manager_patched,
+                                      writer_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = ['INSERT INTO "a" ...']
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), background=True)(fake_test_function)(self_patched)
+
+        self.assertTrue(manager_patched.return_value.fetch_all_tables.called)
+        self.assertFalse(write_patched.called)
+
+        path, function = writer_patched.submit.call_args[0][:2]
+        function(*writer_patched.submit.call_args[0][2:])
+
+        write_patched.assert_called_once_with(path, 'INSERT INTO "a" ...')
+        self.assertTrue(metadata_patched.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.writer')
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_wait_for_pending_dump(self, load_patched, exists_patched, manager_patched, writer_patched):
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock())(fake_test_function)(self_patched)
+
+        writer_patched.wait.assert_called_once_with(exists_patched.call_args[0][0])
+
+    @mock.patch('sqlalchemy_test_cache.decorator.ParallelDumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_render_in_processes(self, load_patched, exists_patched, manager_patched):
+
+        base_model, dbsession = mock.Mock(), mock.Mock()
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(base_model, dbsession, render_processes=4)(fake_test_function)(self_patched)
+        cache_sql(base_model, dbsession, render_processes=True)(fake_test_function)(self_patched)
+
+        manager_patched.assert_has_calls([
+            mock.call(base_model, dbsession, processes=4), mock.call(base_model, dbsession, processes=None)
+        ], any_order=True)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_subset(self, load_patched, exists_patched, manager_patched):
+
+        base_model, dbsession = mock.Mock(), mock.Mock()
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(base_model, dbsession, subset={'country': 10})(fake_test_function)(self_patched)
+
+        manager_patched.assert_called_once_with(base_model, dbsession, subset={'country': 10})
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_run_test_function_when_cache_is_disabled(self, write_patched, read_metadata_patched, exists_patched,
+                                                      manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'disabled': True}
+
+        fake_test_function = mock.Mock(return_value=42)
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        result = cache_sql(mock.Mock(), mock.Mock(), min_speedup=2)(fake_test_function)(self_patched)
+
+        self.assertEqual(result, 42)
+        fake_test_function.assert_called_once_with(self_patched)
+
+        self.assertFalse(manager_patched.return_value.loads.called)
+        self.assertFalse(write_patched.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.unlink')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.time')
+    def test_disable_cache_when_restore_is_slow(self, time_patched, write_metadata_patched, read_metadata_patched,
+                                                load_patched, unlink_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'test_time': 1.0}
+        time_patched.time.side_effect = [10.0, 10.8, 11.0]  # restore took 0.8s, the test took 1.0s.
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), min_speedup=2, delete_slow_dumps=True)(fake_test_function)(self_patched)
+
+        self.assertTrue(manager_patched.return_value.loads.called)
+
+        metadata = write_metadata_patched.call_args[0][1]
+
+        self.assertTrue(metadata['disabled'])
+        self.assertAlmostEqual(metadata['restore_time'], 0.8)
+
+        self.assertTrue(unlink_patched.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.unlink')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.time')
+    def test_keep_cache_when_restore_is_fast(self, time_patched, write_metadata_patched, read_metadata_patched,
+                                             load_patched, unlink_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.return_value = {'test_time': 1.0}
+        time_patched.time.side_effect = [10.0, 10.2, 11.0]  # restore took 0.2s, the test took 1.0s.
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = 'test_fake'
+
+        self_patched = mock.Mock()
+        self_patched.__class__.__name__ = 'FakeTestCase'
+
+        cache_sql(mock.Mock(), mock.Mock(), min_speedup=2, delete_slow_dumps=True)(fake_test_function)(self_patched)
+
+        self.assertNotIn('disabled', write_metadata_patched.call_args[0][1])
+        self.assertFalse(unlink_patched.called)
+
+
+class RestoreScopeTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        self.dbsession = mock.Mock()
+        self.addCleanup(decorator._restored_scopes.clear)
+
+        patcher = mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+        self.manager_patched = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for target in ('os.path.exists', 'load_dump_data_from_file', 'read_dump_metadata', 'write_dump_metadata'):
+            patcher = mock.patch('sqlalchemy_test_cache.decorator.{}'.format(target))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        decorator.read_dump_metadata.return_value = {}
+
+    def create_test_case(self, restore_scope='class', name='FakeTestCase'):
+
+        class FakeTestCase(unittest.TestCase):
+
+            @cache_sql(mock.Mock(), self.dbsession, restore_scope=restore_scope)
+            def _cache_objects(self):
+                pass
+
+            def runTest(self):
+                pass
+
+        FakeTestCase.__name__ = str(name)
+        FakeTestCase.addClassCleanup = mock.Mock()
+
+        return FakeTestCase
+
+    def test_invalid_restore_scope(self):
+
+        with self.assertRaises(ValueError):
+            cache_sql(None, None, restore_scope='session')
+
+    def test_restore_once_per_class(self):
+
+        test_case_class = self.create_test_case()
+        first, second = test_case_class(), test_case_class()
+
+        first._cache_objects()
+        first.doCleanups()
+        second._cache_objects()
+        second.doCleanups()
+
+        self.assertEqual(self.manager_patched.return_value.loads.call_count, 1)
+        self.assertEqual(self.dbsession.begin_nested.call_count, 2)
+        self.assertEqual(self.dbsession.begin_nested.return_value.rollback.call_count, 2)
+        self.assertFalse(self.dbsession.rollback.called)
+
+        test_case_class.addClassCleanup.assert_called_once_with(decorator._release_scope, self.dbsession)
+
+    def test_release_previous_scope(self):
+
+        first = self.create_test_case(name='FirstTestCase')()
+        second = self.create_test_case(name='SecondTestCase')()
+
+        first._cache_objects()
+        first.doCleanups()
+        second._cache_objects()
+
+        self.assertEqual(self.manager_patched.return_value.loads.call_count, 2)
+        self.assertEqual(self.dbsession.rollback.call_count, 1)
+
+    def test_restore_again_when_test_ends_the_outer_transaction(self):
+
+        test_case_class = self.create_test_case()
+        first, second = test_case_class(), test_case_class()
+
+        first._cache_objects()
+        self.dbsession.begin_nested.return_value.is_active = False
+        first.doCleanups()
+        second._cache_objects()
+
+        self.assertEqual(self.manager_patched.return_value.loads.call_count, 2)
+        self.assertFalse(self.dbsession.begin_nested.return_value.rollback.called)
+
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_keep_rows_of_the_first_run_for_the_scope(self, write_patched):
+
+        decorator.os.path.exists.return_value = False
+        self.manager_patched.return_value.dump_all_tables.return_value = []
+
+        test_case = self.create_test_case()()
+
+        test_case._cache_objects()
+
+        self.assertTrue(write_patched.called)
+        self.assertTrue(self.dbsession.begin_nested.called)
+        self.assertIn(self.dbsession, decorator._restored_scopes)
+
+
+class LayerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(decorator._layers.clear)
+
+    @mock.patch('sqlalchemy_test_cache.decorator._get_layer_statements')
+    def test_split_base_layer(self, layer_patched):
+
+        layer_patched.return_value = ['INSERT 1;', 'INSERT 2;']
+
+        delta = decorator._split_base_layer(['INSERT 1;', 'INSERT 2;', 'INSERT 3;'], 'seed')
+
+        self.assertListEqual(delta, ['INSERT 3;'])
+        layer_patched.assert_called_once_with('seed')
+
+    @mock.patch('sqlalchemy_test_cache.decorator._get_layer_statements')
+    def test_split_base_layer_with_changed_rows(self, layer_patched):
+
+        layer_patched.return_value = ['INSERT 1;', 'INSERT 2;']
+
+        self.assertIsNone(decorator._split_base_layer(['INSERT 1;', 'INSERT 3;'], 'seed'))
+
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    def test_layer_statements_are_read_once(self, load_patched, read_metadata_patched):
+
+        read_metadata_patched.return_value = {'checksum': 'abc'}
+        load_patched.return_value = ['INSERT 1;\n', '\n', 'INSERT 2;']
+
+        decorator._get_layer_statements('seed')
+
+        self.assertListEqual(decorator._get_layer_statements('seed'), ['INSERT 1;', 'INSERT 2;'])
+        self.assertEqual(load_patched.call_count, 1)
+
+        read_metadata_patched.return_value = {'checksum': 'def'}
+
+        decorator._get_layer_statements('seed')
+
+        self.assertEqual(load_patched.call_count, 2)
+
+    def test_layer_and_base_layer_together(self):
+
+        with self.assertRaises(ValueError):
+            cache_sql(None, None, layer='seed', base_layer='seed')
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_layer_dump_path(self, write_patched, metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = False
+        manager_patched.return_value.dump_all_tables.return_value = []
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = '_seed'
+
+        cache_sql(mock.Mock(), mock.Mock(), layer='seed')(fake_test_function)(mock.Mock())
+
+        self.assertEqual(write_patched.call_args[0][0], '/tmp/layer-seed.dump')
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    @mock.patch('sqlalchemy_test_cache.decorator._get_layer_statements')
+    def test_write_delta_on_top_of_base_layer(self, layer_patched, write_patched, write_metadata_patched,
+                                              read_metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.side_effect = lambda path: path == '/tmp/layer-seed.dump'
+        read_metadata_patched.side_effect = lambda path: {'checksum': 'abc'} if 'layer' in path else {}
+        layer_patched.return_value = ['INSERT 1;', 'INSERT 2;']
+        manager_patched.return_value.dump_all_tables.return_value = ['INSERT 1;', 'INSERT 2;', 'INSERT 3;']
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = '_cache_objects'
+
+        cache_sql(mock.Mock(), mock.Mock(), base_layer='seed')(fake_test_function)(mock.Mock())
+
+        self.assertEqual(write_patched.call_args[0][1], 'INSERT 3;')
+
+        metadata = write_metadata_patched.call_args[0][1]
+
+        self.assertEqual(metadata['base_layer'], 'seed')
+        self.assertEqual(metadata['base_checksum'], 'abc')
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.load_dump_data_from_file')
+    @mock.patch('sqlalchemy_test_cache.decorator._get_layer_statements')
+    def test_loads_base_layer_then_delta(self, layer_patched, load_patched, write_metadata_patched,
+                                         read_metadata_patched, exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.side_effect = lambda path: (
+            {'checksum': 'abc'} if 'layer' in path else {'base_layer': 'seed', 'base_checksum': 'abc'}
+        )
+        layer_patched.return_value = ['INSERT 1;', 'INSERT 2;']
+        load_patched.return_value = ['INSERT 3;']
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = '_cache_objects'
+
+        cache_sql(mock.Mock(), mock.Mock(), base_layer='seed')(fake_test_function)(mock.Mock())
+
+        self.assertFalse(fake_test_function.called)
+        manager_patched.return_value.loads.assert_has_calls([
+            mock.call(['INSERT 1;', 'INSERT 2;']), mock.call(['INSERT 3;'])
+        ])
+
+    @mock.patch('sqlalchemy_test_cache.decorator.DumpManager')
+    @mock.patch('sqlalchemy_test_cache.decorator.os.path.exists')
+    @mock.patch('sqlalchemy_test_cache.decorator.read_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_metadata')
+    @mock.patch('sqlalchemy_test_cache.decorator.write_dump_data_to_file')
+    def test_run_again_when_base_layer_changed(self, write_patched, write_metadata_patched, read_metadata_patched,
+                                               exists_patched, manager_patched):
+
+        exists_patched.return_value = True
+        read_metadata_patched.side_effect = lambda path: (
+            {'checksum': 'def'} if 'layer' in path else {'base_layer': 'seed', 'base_checksum': 'abc'}
+        )
+        manager_patched.return_value.dump_all_tables.return_value = []
+
+        fake_test_function = mock.Mock()
+        fake_test_function.__name__ = '_cache_objects'
+
+        with mock.patch('sqlalchemy_test_cache.decorator._get_layer_statements', return_value=[]):
+            cache_sql(mock.Mock(), mock.Mock(), base_layer='seed')(fake_test_function)(mock.Mock())
+
+        self.assertTrue(fake_test_function.called)
+        self.assertFalse(manager_patched.return_value.loads.called)
+        self.assertTrue(write_patched.called)
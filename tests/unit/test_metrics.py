@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_metrics
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.metrics` module.
+"""
+from __future__ import unicode_literals
+
+import io
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+from sqlalchemy_test_cache import metrics
+
+
+def create_event(test='tests.FooTestCase.test_foo', hit=True, test_time=2.0, dump_time=None, restore_time=0.5,
+                 tables=None):
+    return metrics.CacheEvent(
+        test, '/tmp/FooTestCase.dump', hit, test_time, dump_time, restore_time,
+        tables if tables is not None else {'foo': {'rows': 10, 'bytes': 1000}}
+    )
+
+
+class CacheEventTestCase(unittest.TestCase):
+
+    def test_time_saved_on_hit(self):
+        self.assertEqual(create_event(test_time=2.0, restore_time=0.5).time_saved, 1.5)
+
+    def test_time_saved_on_miss(self):
+        self.assertIsNone(create_event(hit=False, dump_time=1.0, restore_time=None).time_saved)
+
+    def test_time_saved_without_test_time(self):
+        self.assertIsNone(create_event(test_time=None).time_saved)
+
+
+class HooksTestCase(unittest.TestCase):
+
+    def test_emit_to_registered_hooks(self):
+
+        hook = mock.Mock()
+        event = create_event()
+
+        metrics.add_hook(hook)
+        metrics.add_hook(hook)
+
+        try:
+            metrics.emit(event)
+        finally:
+            metrics.remove_hook(hook)
+
+        hook.assert_called_once_with(event)
+
+    def test_removed_hook_is_not_called(self):
+
+        hook = mock.Mock()
+
+        metrics.add_hook(hook)
+        metrics.remove_hook(hook)
+
+        metrics.emit(create_event())
+
+        self.assertFalse(hook.called)
+
+
+class MetricsCollectorTestCase(unittest.TestCase):
+
+    def test_summary(self):
+
+        collector = metrics.MetricsCollector()
+
+        collector(create_event(hit=False, dump_time=1.0, restore_time=None))
+        collector(create_event(test_time=2.0, restore_time=0.5))
+        collector(create_event(test_time=2.0, restore_time=0.25))
+
+        self.assertEqual(collector.summary(), {
+            'hits': 2, 'misses': 1, 'dump_time': 1.0, 'restore_time': 0.75, 'time_saved': 3.25
+        })
+
+    def test_report(self):
+
+        collector = metrics.MetricsCollector()
+
+        collector(create_event(hit=False, dump_time=1.0, restore_time=None))
+        collector(create_event(test_time=2.0, restore_time=0.5))
+
+        stream = io.StringIO()
+
+        collector.report(stream)
+
+        lines = stream.getvalue().splitlines()
+
+        self.assertEqual(
+            lines[0], 'sqlalchemy-test-cache: 1 hits, 1 misses, dump 1.000s, restore 0.500s, saved 1.500s'
+        )
+        self.assertEqual(
+            lines[1], '  tests.FooTestCase.test_foo: 1 hits, 1 misses, test 2.000s, restore 0.500s, 10 rows, 1000 bytes'
+        )
+
+    def test_clear(self):
+
+        collector = metrics.MetricsCollector()
+        collector(create_event())
+        collector.clear()
+
+        self.assertListEqual(collector.events, [])
+
+    @mock.patch('sqlalchemy_test_cache.metrics.atexit.register')
+    def test_enable_session_report_once_per_stream(self, register_patched):
+
+        stream = io.StringIO()
+
+        metrics.enable_session_report(stream)
+        metrics.enable_session_report(stream)
+
+        register_patched.assert_called_once_with(metrics.collector.report, stream)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parallel
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.parallel` module.
+"""
+from __future__ import unicode_literals
+
+import collections
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+from sqlalchemy_test_cache import parallel
+
+
+FakeMetadata = collections.namedtuple('FakeMetadata', 'sorted_tables')
+FakeBaseModel = collections.namedtuple('FakeBaseModel', 'metadata')
+
+
+def create_table():
+    return sa.Table(
+        'faketable', sa.MetaData(), sa.Column('id', sa.Integer, primary_key=True), sa.Column('name', sa.String)
+    )
+
+
+class RenderChunkTestCase(unittest.TestCase):
+
+    def test_render_chunk(self):
+
+        parallel._init_worker('sqlite', 'pysqlite', ())
+        self.addCleanup(parallel._worker_renderers.clear)
+
+        statements = parallel.render_chunk('faketable', ['id', 'name'], [sa.Integer(), sa.String()], [(1, "it's")])
+
+        self.assertListEqual(statements, ['INSERT INTO "faketable" (id, name) VALUES (1, \'it\'\'s\');'])
+
+    def test_dialect_attributes(self):
+
+        dialect = parallel._create_dialect('mysql', 'pymysql', (('_backslash_escapes', True),))
+
+        self.assertEqual(dialect.name, 'mysql')
+        self.assertTrue(dialect._backslash_escapes)
+
+
+class ParallelDumpManagerTestCase(unittest.TestCase):
+
+    def create_dump_manager(self, rows, **kwargs):
+
+        table = create_table()
+
+        dbsession = mock.Mock()
+        dbsession.bind.dialect = sqlite.dialect()
+
+        dm = parallel.ParallelDumpManager(FakeBaseModel(FakeMetadata([table])), dbsession, **kwargs)
+        dm._fetched_rows[table.name] = rows
+
+        return dm, table
+
+    def test_iter_chunks(self):
+
+        dm, table = self.create_dump_manager([(1, 'a'), (2, 'b'), (3, 'c')], chunk_size=2)
+
+        self.assertListEqual(list(dm._iter_chunks(table)), [[(1, 'a'), (2, 'b')], [(3, 'c')]])
+
+    @mock.patch('sqlalchemy_test_cache.parallel.get_pool')
+    def test_collect_chunks_in_order(self, get_pool_patched):
+
+        pool = get_pool_patched.return_value
+        pool.apply_async.side_effect = lambda function, args: mock.Mock(get=mock.Mock(return_value=function(*args)))
+
+        parallel._init_worker('sqlite', 'pysqlite', ())
+        self.addCleanup(parallel._worker_renderers.clear)
+
+        dm, table = self.create_dump_manager([(1, 'a'), (2, 'b'), (3, 'c')], chunk_size=2, max_pending=1)
+
+        statements = dm.dump(table)
+
+        self.assertEqual(pool.apply_async.call_count, 2)
+        self.assertListEqual(statements, [
+            'INSERT INTO "faketable" (id, name) VALUES (1, \'a\');',
+            'INSERT INTO "faketable" (id, name) VALUES (2, \'b\');',
+            'INSERT INTO "faketable" (id, name) VALUES (3, \'c\');',
+        ])
+        self.assertEqual(dm.table_stats['faketable']['rows'], 3)
+
+    @mock.patch('sqlalchemy_test_cache.parallel.get_pool')
+    @mock.patch('sqlalchemy_test_cache.parallel.multiprocessing.current_process')
+    def test_render_in_process_when_daemonic(self, current_process_patched, get_pool_patched):
+
+        current_process_patched.return_value.daemon = True
+
+        dm, table = self.create_dump_manager([(1, 'a')])
+
+        self.assertListEqual(dm.dump(table), ['INSERT INTO "faketable" (id, name) VALUES (1, \'a\');'])
+        self.assertFalse(get_pool_patched.called)
+
+    def test_render_in_pool(self):
+
+        self.addCleanup(parallel.close_pools)
+
+        dm, table = self.create_dump_manager([(i, 'name {}'.format(i)) for i in range(5)], processes=1, chunk_size=2)
+
+        self.assertListEqual(dm.dump(table), parallel.DumpManager.dump(dm, table))
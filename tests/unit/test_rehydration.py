@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_rehydration
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.rehydration` module.
+"""
+from __future__ import unicode_literals
+
+import unittest
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session, declarative_base
+
+from sqlalchemy_test_cache import rehydration
+
+
+Base = declarative_base()
+
+
+class User(Base):
+
+    __tablename__ = 'user'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(32))
+
+
+class Membership(Base):
+
+    __tablename__ = 'membership'
+
+    user_id = sa.Column(sa.Integer, primary_key=True)
+    group = sa.Column(sa.String(32), primary_key=True)
+
+
+class FakeTestCase(object):
+
+    class Nested(object):
+        pass
+
+
+class ImportClassTestCase(unittest.TestCase):
+
+    def test_import_class(self):
+        self.assertIs(rehydration.import_class(rehydration.get_class_path(User)), User)
+
+    def test_import_nested_class(self):
+
+        class_path = rehydration.get_class_path(FakeTestCase.Nested)
+
+        self.assertIs(rehydration.import_class(class_path), FakeTestCase.Nested)
+
+
+class RehydrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        engine = sa.create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+
+        self.dbsession = Session(bind=engine)
+        self.addCleanup(self.dbsession.close)
+
+        self.queries = []
+        sa.event.listen(engine, 'before_cursor_execute', lambda *args: self.queries.append(args[2]))
+
+    def test_record_instances(self):
+
+        test_case = FakeTestCase()
+        test_case.user = User(id=1, name='first')
+        test_case.users = [User(id=2, name='second'), User(id=3, name='third')]
+        test_case.membership = Membership(user_id=1, group='admin')
+        test_case.name = 'not mapped'
+        test_case.empty = []
+
+        self.dbsession.add_all([test_case.user, test_case.membership] + test_case.users)
+        self.dbsession.flush()
+
+        self.assertDictEqual(rehydration.record_instances(test_case), {
+            'membership': {'many': False, 'instances': [[rehydration.get_class_path(Membership), [1, 'admin']]]},
+            'user': {'many': False, 'instances': [[rehydration.get_class_path(User), [1]]]},
+            'users': {'many': True, 'instances': [
+                [rehydration.get_class_path(User), [2]], [rehydration.get_class_path(User), [3]]
+            ]},
+        })
+
+    def test_pending_instances_are_not_recorded(self):
+
+        test_case = FakeTestCase()
+        test_case.user = User(name='pending')
+
+        self.assertDictEqual(rehydration.record_instances(test_case), {})
+
+    def test_rehydrate_instances_with_a_query_per_class(self):
+
+        self.dbsession.add_all([
+            User(id=1, name='first'), User(id=2, name='second'), Membership(user_id=1, group='admin'),
+        ])
+        self.dbsession.flush()
+        self.dbsession.expunge_all()
+
+        user_path, membership_path = rehydration.get_class_path(User), rehydration.get_class_path(Membership)
+
+        test_case = FakeTestCase()
+        del self.queries[:]
+
+        rehydration.rehydrate_instances(test_case, self.dbsession, {
+            'user': {'many': False, 'instances': [[user_path, [1]]]},
+            'users': {'many': True, 'instances': [[user_path, [2]], [user_path, [1]]]},
+            'membership': {'many': False, 'instances': [[membership_path, [1, 'admin']]]},
+        })
+
+        self.assertEqual(len(self.queries), 2)
+        self.assertEqual(test_case.user.name, 'first')
+        self.assertListEqual([user.name for user in test_case.users], ['second', 'first'])
+        self.assertIs(test_case.users[1], test_case.user)
+        self.assertEqual(test_case.membership.group, 'admin')
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_renderers
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.renderers` module.
+"""
+from __future__ import unicode_literals
+
+import datetime
+import decimal
+import enum
+import unittest
+import uuid
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from sqlalchemy_test_cache.renderers import get_type_renderer
+from sqlalchemy_test_cache.sqlalchemy_test_cache import DumpManager
+
+
+class Color(enum.Enum):
+    red = 1
+    blue = 2
+
+
+def render(dialect, type_, value, fallback=None):
+    return get_type_renderer(dialect, type_, fallback or mock.Mock(return_value='FALLBACK'))(value)
+
+
+class GetTypeRendererTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.postgresql = postgresql.dialect()
+        self.sqlite = sqlite.dialect()
+
+    def test_null(self):
+
+        for type_ in (sa.Integer(), sa.String(), sa.JSON(), sa.LargeBinary()):
+            self.assertEqual(render(self.postgresql, type_, None), 'Null')
+
+    def test_numbers(self):
+
+        self.assertEqual(render(self.sqlite, sa.Integer(), 2 ** 70), str(2 ** 70))
+        self.assertEqual(render(self.sqlite, sa.Float(), 0.1), '0.1')
+        self.assertEqual(render(self.sqlite, sa.Numeric(), decimal.Decimal('1.50')), '1.50')
+        self.assertEqual(render(self.postgresql, sa.Float(), float('-inf')), "'-Infinity'")
+        self.assertEqual(render(self.postgresql, sa.Numeric(), decimal.Decimal('NaN')), "'NaN'")
+        self.assertEqual(render(self.sqlite, sa.Float(), float('nan')), 'FALLBACK')
+
+    def test_boolean(self):
+
+        self.assertEqual(render(self.postgresql, sa.Boolean(), True), 'true')
+        self.assertEqual(render(self.sqlite, sa.Boolean(), False), '0')
+
+    def test_strings(self):
+
+        self.assertEqual(render(self.postgresql, sa.String(), "it's 100% \\n"), "'it''s 100% \\n'")
+
+        dialect = mysql.dialect()
+        dialect._backslash_escapes = True
+
+        self.assertEqual(render(dialect, sa.String(), 'a\\b'), "'a\\\\b'")
+
+    def test_enum(self):
+
+        self.assertEqual(render(self.postgresql, sa.Enum('red', 'blue', name='color'), 'red'), "'red'")
+        self.assertEqual(render(self.postgresql, sa.Enum(Color), Color.blue), "'blue'")
+
+    def test_uuid(self):
+
+        value = uuid.UUID('12345678-1234-5678-1234-567812345678')
+
+        self.assertEqual(render(self.postgresql, postgresql.UUID(), value), "'12345678-1234-5678-1234-567812345678'")
+        self.assertEqual(render(self.postgresql, postgresql.UUID(as_uuid=False), str(value)),
+                         "'12345678-1234-5678-1234-567812345678'")
+
+        if hasattr(sa, 'Uuid'):
+            self.assertEqual(render(self.sqlite, sa.Uuid(), value), "'12345678123456781234567812345678'")
+
+    def test_binary(self):
+
+        self.assertEqual(render(self.postgresql, sa.LargeBinary(), b'\x00\xff'), "'\\x00ff'")
+        self.assertEqual(render(self.sqlite, sa.LargeBinary(), memoryview(b'\x00\xff')), "X'00ff'")
+
+    def test_json(self):
+
+        self.assertEqual(render(self.postgresql, postgresql.JSONB(), {'name': "it's"}), '\'{"name": "it\'\'s"}\'')
+        self.assertEqual(render(self.sqlite, sa.JSON(), [1, 2]), "'[1, 2]'")
+
+    def test_array(self):
+
+        self.assertEqual(render(self.postgresql, postgresql.ARRAY(sa.Integer), [1, None]), 'ARRAY[1, Null]::INTEGER[]')
+        self.assertEqual(render(self.postgresql, postgresql.ARRAY(sa.Integer), []), "'{}'::INTEGER[]")
+        self.assertEqual(
+            render(self.postgresql, postgresql.ARRAY(sa.String, dimensions=2), [['a', "b'"], ['c', 'd']]),
+            "ARRAY[ARRAY['a', 'b'''], ARRAY['c', 'd']]::VARCHAR[][]"
+        )
+
+    def test_datetimes(self):
+
+        value = datetime.datetime(2016, 11, 16, 10, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+
+        self.assertEqual(render(self.postgresql, sa.DateTime(timezone=True), value), "'2016-11-16 10:30:00+02:00'")
+        self.assertEqual(render(self.sqlite, sa.DateTime(), datetime.datetime(2016, 11, 16, 10, 30)),
+                         "'2016-11-16 10:30:00.000000'")
+        self.assertEqual(render(self.sqlite, sa.Date(), datetime.date(2016, 11, 16)), "'2016-11-16'")
+
+    def test_fallback(self):
+
+        fallback = mock.Mock(return_value='FALLBACK')
+        type_ = sa.Interval()
+
+        self.assertEqual(render(self.postgresql, type_, datetime.timedelta(1), fallback), 'FALLBACK')
+        fallback.assert_called_once_with(datetime.timedelta(1), type_)
+
+        self.assertEqual(render(self.postgresql, sa.Integer(), 'not an integer'), 'FALLBACK')
+
+
+class RoundTripTestCase(unittest.TestCase):
+
+    def test_dump_and_load_sqlite(self):
+
+        metadata = sa.MetaData()
+
+        table = sa.Table(
+            'faketable', metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('flag', sa.Boolean),
+            sa.Column('ratio', sa.Float),
+            sa.Column('amount', sa.Numeric(10, 2)),
+            sa.Column('name', sa.String),
+            sa.Column('color', sa.Enum(Color)),
+            sa.Column('data', sa.LargeBinary),
+            sa.Column('document', sa.JSON),
+            sa.Column('created', sa.DateTime),
+        )
+
+        row = {
+            'id': 1, 'flag': True, 'ratio': 0.1, 'amount': decimal.Decimal('1.50'), 'name': "it's", 'color': Color.blue,
+            'data': b'\x00\xff', 'document': {'name': "it's", 'items': [1, None]},
+            'created': datetime.datetime(2016, 11, 16, 10, 30, 0, 1),
+        }
+
+        engine = sa.create_engine('sqlite://')
+        metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            connection.execute(table.insert(), [row])
+
+        base_model = mock.Mock(metadata=metadata)
+        dbsession = Session(bind=engine)
+
+        statements = DumpManager(base_model, dbsession).dump_all_tables()
+
+        dbsession.execute(table.delete())
+        DumpManager(base_model, dbsession).loads(statements)
+
+        self.assertDictEqual(dict(dbsession.execute(sa.select(table)).mappings().one()), row)
@@ -19,7 +19,10 @@ try:
 except ImportError:  # PY2
     import mock  # pip install mock...
 
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
 
+from sqlalchemy_test_cache import columnar
 from sqlalchemy_test_cache.sqlalchemy_test_cache import DumpManager
 
 
@@ -125,15 +128,11 @@ class DumpManagerTestCase(unittest.TestCase):
 
         row = True, 42, datetime.date.today(), datetime.datetime.now()
 
-        mock_dialect = mock.PropertyMock()
+        mock_dialect = mock.Mock()
 
         dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
 
-        with mock.patch.object(dm, 'dbsession', new_callable=mock_dialect) as dbsession_patched:
-            dbsession_patched.bind.dialect = mock_dialect
-            dm._dump_row_values(row, columns)
-
-        self.assertTrue(mock_dialect.called)
+        dm._dump_row_values(row, columns, mock_dialect)
 
         self.assertEqual(render_value_patched.call_count, 4)
 
@@ -224,6 +223,33 @@ class DumpManagerTestCase(unittest.TestCase):
 
         self.assertListEqual(result, expected_result)
 
+    def test_dump_table_stats(self):
+
+        table = FakeTable(
+            name='thespecialone',
+            columns=collections.OrderedDict((
+                ('name', FakeColumn('name', str)),
+                ('age', FakeColumn('age', int)),
+            ))
+        )
+
+        rows = ('Name1', 23), ('Name2', 24)
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
+
+        with mock.patch('sqlalchemy_test_cache.sqlalchemy_test_cache.render_value') as mock_render_value:
+
+            mock_render_value.side_effect = fake_render_value
+
+            with mock.patch.object(dm, 'dbsession') as dbsession_patched:
+
+                dbsession_patched.query.return_value = rows
+                result = dm.dump(table)
+
+        self.assertEqual(dm.table_stats, {
+            'thespecialone': {'rows': 2, 'bytes': sum(len(statement) + 1 for statement in result)}
+        })
+
     def test_dump_with_created(self):
 
         table = FakeTable(
@@ -453,3 +479,280 @@ class DumpManagerTestCase(unittest.TestCase):
                     ', '.join(fake_render_value(None, item, None) for item in rows[table.name][0])
                 )
             )
+
+    def test_loads(self):
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
+
+        dm.loads(['INSERT INTO "faketable" (id) VALUES (1);\n', '\n', 'INSERT INTO "faketable" (id) VALUES (2);'])
+
+        connection = dm.dbsession.connection.return_value
+
+        connection.exec_driver_sql.assert_has_calls([
+            mock.call('INSERT INTO "faketable" (id) VALUES (1);'), mock.call('INSERT INTO "faketable" (id) VALUES (2);')
+        ])
+        self.assertEqual(connection.exec_driver_sql.call_count, 2)
+        self.assertTrue(dm.dbsession.flush.called)
+
+    def test_loads_without_exec_driver_sql(self):
+
+        # SQLAlchemy < 1.4 executes plain strings through ``Connection.execute``
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
+        dm.dbsession.connection.return_value = mock.Mock(spec=['execute'])
+
+        dm.loads(['INSERT INTO "faketable" (id) VALUES (1);\n'])
+
+        dm.dbsession.connection.return_value.execute.assert_called_once_with('INSERT INTO "faketable" (id) VALUES (1);')
+
+    def test_loads_only_given_tables(self):
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
+
+        dm.loads(['INSERT INTO "user" (id) VALUES (1);\n', 'INSERT INTO "address" (id) VALUES (1);\n'], tables={'user'})
+
+        dm.dbsession.connection.return_value.exec_driver_sql.assert_called_once_with('INSERT INTO "user" (id) VALUES (1);')
+
+    def test_get_required_tables(self):
+
+        country, user, address, log = FakeTable('country'), FakeTable('user'), FakeTable('address'), FakeTable('log')
+
+        country.foreign_keys = log.foreign_keys = set()
+        user.foreign_keys = {mock.Mock(column=mock.Mock(table=country))}
+        address.foreign_keys = {mock.Mock(column=mock.Mock(table=user)), mock.Mock(column=mock.Mock(table=address))}
+
+        dm = DumpManager(base_model=FakeBaseModel(FakeMetadata([country, user, address, log])), dbsession=mock.Mock())
+
+        self.assertSetEqual(dm.get_required_tables(['address', 'unknown']), {'address', 'user', 'country'})
+
+    def test_dump_columnar(self):
+
+        table = FakeTable(columns=FakeColumns((('id', FakeColumn('id', int)), ('name', FakeColumn('name', str)))))
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock())
+
+        with mock.patch.object(dm, '_get_table_rows', return_value=[(1, 'Name1'), (2, 'Name2')]):
+            block = dm.dump_columnar(table)
+
+        self.assertEqual(block, columnar.encode_table('faketable', ['id', 'name'], [(1, 'Name1'), (2, 'Name2')]))
+        self.assertDictEqual(dm.table_stats['faketable'], {'rows': 2, 'bytes': len(block)})
+
+    def test_loads_columnar(self):
+
+        table = FakeTable(columns=FakeColumns((
+            ('id', mock.Mock(key='id')), ('name', mock.Mock(key='name_key'))
+        )))
+        table.columns['id'].name, table.columns['name'].name = 'id', 'name'
+        table.insert = mock.Mock()
+
+        dm = DumpManager(base_model=FakeBaseModel(FakeMetadata([table])), dbsession=mock.Mock())
+
+        dm.loads_columnar([('faketable', ['id', 'name'], [(1, 'Name1'), (2, 'Name2'), (3, 'Name3')])], batch_size=2)
+
+        dm.dbsession.connection.return_value.execute.assert_has_calls([
+            mock.call(table.insert.return_value, [{'id': 1, 'name_key': 'Name1'}, {'id': 2, 'name_key': 'Name2'}]),
+            mock.call(table.insert.return_value, [{'id': 3, 'name_key': 'Name3'}]),
+        ])
+        self.assertTrue(dm.dbsession.flush.called)
+
+    def test_fetch_all_tables(self):
+
+        table = FakeTable(columns=FakeColumns((('id', FakeColumn('id', int)),)))
+
+        dm = DumpManager(base_model=FakeBaseModel(FakeMetadata([table])), dbsession=mock.Mock())
+        dm.dbsession.query.return_value.order_by.return_value = iter([(1,), (2,)])
+
+        dm.fetch_all_tables()
+
+        dm.dbsession.reset_mock()
+
+        with mock.patch('sqlalchemy_test_cache.sqlalchemy_test_cache.render_value', side_effect=lambda d, v, t: str(v)):
+            statements = dm.dump_all_tables()
+
+        self.assertListEqual(statements, [
+            'INSERT INTO "faketable" (id) VALUES (1);', 'INSERT INTO "faketable" (id) VALUES (2);'
+        ])
+        self.assertFalse(dm.dbsession.query.called)
+
+    def create_dump_manager_for_driver(self, name, driver, **kwargs):
+
+        dbsession = mock.Mock()
+        dbsession.bind.dialect.name = name
+        dbsession.bind.dialect.driver = driver
+
+        return DumpManager(base_model=mock.Mock(), dbsession=dbsession, **kwargs)
+
+    def test_iter_batches(self):
+
+        dm = DumpManager(base_model=mock.Mock(), dbsession=mock.Mock(), batch_bytes=20)
+
+        batches = list(dm._iter_batches(['INSERT 1;\n', '\n', 'INSERT 2;\n', 'INSERT 3;\n', 'INSERT INTO 4 ...;']))
+
+        self.assertListEqual(batches, [['INSERT 1;', 'INSERT 2;'], ['INSERT 3;'], ['INSERT INTO 4 ...;']])
+
+    def test_loads_script_per_batch(self):
+
+        dm = self.create_dump_manager_for_driver('postgresql', 'psycopg2', batch_bytes=20)
+
+        dm.loads(['INSERT 1;\n', 'INSERT 2;\n', 'INSERT 3;\n'])
+
+        dm.dbsession.connection.return_value.exec_driver_sql.assert_has_calls([
+            mock.call('INSERT 1;\nINSERT 2;'), mock.call('INSERT 3;')
+        ])
+
+    def test_loads_mysql_script_with_multi_statements(self):
+
+        dm = self.create_dump_manager_for_driver('mysql', 'pymysql')
+
+        raw_connection = dm.dbsession.connection.return_value.connection
+        raw_connection.client_flag = DumpManager.MYSQL_MULTI_STATEMENTS_FLAG
+        raw_connection.cursor.return_value.nextset.side_effect = [True, None]
+
+        dm.loads(['INSERT 1;\n', 'INSERT 2;\n'])
+
+        raw_connection.cursor.return_value.execute.assert_called_once_with('INSERT 1;\nINSERT 2;')
+        self.assertEqual(raw_connection.cursor.return_value.nextset.call_count, 2)
+
+    def test_loads_mysql_without_multi_statements(self):
+
+        dm = self.create_dump_manager_for_driver('mysql', 'pymysql')
+        dm.dbsession.connection.return_value.connection.client_flag = 0
+
+        dm.loads(['INSERT 1;\n', 'INSERT 2;\n'])
+
+        self.assertEqual(dm.dbsession.connection.return_value.exec_driver_sql.call_count, 2)
+
+    def test_loads_sqlite_through_driver_cursor(self):
+
+        dm = self.create_dump_manager_for_driver('sqlite', 'pysqlite')
+
+        dm.loads(['INSERT 1;\n', 'INSERT 2;\n'])
+
+        cursor = dm.dbsession.connection.return_value.connection.cursor.return_value
+
+        cursor.execute.assert_has_calls([mock.call('INSERT 1;'), mock.call('INSERT 2;')])
+        self.assertFalse(cursor.executescript.called)
+
+    def test_reset_postgresql_in_a_single_truncate(self):
+
+        user, address, log = FakeTable('user'), FakeTable('address'), FakeTable('log')
+
+        dm = self.create_dump_manager_for_driver('postgresql', 'psycopg2')
+        dm.base_model = FakeBaseModel(FakeMetadata([user, address, log]))
+        dm.dbsession.bind.dialect.identifier_preparer.format_table.side_effect = lambda table: '"{}"'.format(table.name)
+
+        with mock.patch.object(dm, 'get_non_empty_tables', return_value={'user', 'address'}):
+            dm.reset()
+
+        dm.dbsession.connection.return_value.exec_driver_sql.assert_called_once_with(
+            'TRUNCATE "user", "address" RESTART IDENTITY CASCADE'
+        )
+        self.assertTrue(dm.dbsession.expire_all.called)
+
+    def test_reset_mysql_without_foreign_key_checks(self):
+
+        user, address = FakeTable('user'), FakeTable('address')
+        user.delete, address.delete = mock.Mock(), mock.Mock()
+
+        dm = self.create_dump_manager_for_driver('mysql', 'pymysql')
+        dm.base_model = FakeBaseModel(FakeMetadata([user, address]))
+
+        with mock.patch.object(dm, 'get_non_empty_tables', return_value={'user', 'address'}):
+            dm.reset()
+
+        dm.dbsession.connection.return_value.exec_driver_sql.assert_has_calls([
+            mock.call('SET FOREIGN_KEY_CHECKS = 0'), mock.call('SET FOREIGN_KEY_CHECKS = 1')
+        ])
+        dm.dbsession.execute.assert_has_calls([mock.call(user.delete.return_value), mock.call(address.delete.return_value)])
+
+    def test_reset_empty_tables(self):
+
+        dm = self.create_dump_manager_for_driver('postgresql', 'psycopg2')
+        dm.base_model = FakeBaseModel(FakeMetadata([FakeTable('user')]))
+
+        with mock.patch.object(dm, 'get_non_empty_tables', return_value=set()):
+            dm.reset()
+
+        self.assertFalse(dm.dbsession.connection.called)
+
+
+class ResetSQLiteTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        engine = sa.create_engine('sqlite://')
+
+        @sa.event.listens_for(engine, 'connect')
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+        metadata = sa.MetaData()
+
+        self.user = sa.Table(
+            'user', metadata, sa.Column('id', sa.Integer, primary_key=True), sqlite_autoincrement=True
+        )
+        self.address = sa.Table(
+            'address', metadata, sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('user_id', sa.ForeignKey('user.id'))
+        )
+        self.log = sa.Table('log', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+        metadata.create_all(engine)
+
+        self.dbsession = Session(bind=engine)
+        self.addCleanup(self.dbsession.close)
+
+        self.dbsession.execute(self.user.insert(), [{'id': 1}, {'id': 2}])
+        self.dbsession.execute(self.address.insert(), [{'id': 1, 'user_id': 1}])
+
+        self.dm = DumpManager(FakeBaseModel(metadata), self.dbsession)
+
+        self.statements = []
+        sa.event.listen(engine, 'before_cursor_execute', lambda *args: self.statements.append(args[2]))
+
+    def test_get_non_empty_tables(self):
+
+        self.assertSetEqual(self.dm.get_non_empty_tables(), {'user', 'address'})
+        self.assertEqual(len(self.statements), 1)
+
+    def test_reset(self):
+
+        self.dm.reset()
+
+        for table in (self.user, self.address, self.log):
+            self.assertEqual(self.dbsession.execute(sa.select(sa.func.count()).select_from(table)).scalar(), 0)
+
+        self.assertFalse(any(statement.startswith('DELETE FROM log') for statement in self.statements))
+
+        # The ids of the AUTOINCREMENT table start over.
+        self.dbsession.execute(self.user.insert(), [{}])
+        self.assertEqual(self.dbsession.execute(sa.select(self.user.c.id)).scalar(), 1)
+
+
+class SubsetDumpTestCase(unittest.TestCase):
+
+    def test_dump_subset(self):
+
+        metadata = sa.MetaData()
+        country = sa.Table('country', metadata, sa.Column('id', sa.Integer, primary_key=True))
+        sa.Table(
+            'user', metadata, sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('country_id', sa.ForeignKey('country.id'))
+        )
+
+        engine = sa.create_engine('sqlite://')
+        metadata.create_all(engine)
+
+        dbsession = Session(bind=engine)
+        self.addCleanup(dbsession.close)
+
+        dbsession.execute(country.insert(), [{'id': id_} for id_ in range(1, 1001)])
+        dbsession.execute(metadata.tables['user'].insert(), [{'id': 1, 'country_id': 500}])
+
+        dm = DumpManager(FakeBaseModel(metadata), dbsession, subset={'country': 1})
+
+        self.assertListEqual(dm.dump_all_tables(), [
+            'INSERT INTO "country" (id) VALUES (1);',
+            'INSERT INTO "country" (id) VALUES (500);',
+            'INSERT INTO "user" (id, country_id) VALUES (1, 500);',
+        ])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_storage
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.storage` module.
+"""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+from sqlalchemy_test_cache import storage
+
+
+class GroupStatementsByTableTestCase(unittest.TestCase):
+
+    def test_group_consecutive_statements(self):
+
+        statements = [
+            'INSERT INTO "user" (id) VALUES (1);',
+            'INSERT INTO "user" (id) VALUES (2);',
+            'INSERT INTO "address" (id) VALUES (1);',
+        ]
+
+        self.assertListEqual(storage.group_statements_by_table(statements), [
+            ('user', statements[:2]), ('address', statements[2:])
+        ])
+
+
+class ChunkedDumpTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.addCleanup(storage.clear_chunk_cache)
+
+    def test_write_chunk_once(self):
+
+        chunk_hash = storage.write_chunk('INSERT INTO "user" (id) VALUES (1);', self.cache_dir)
+        chunk_path = storage.generate_chunk_path(chunk_hash, self.cache_dir)
+
+        os.utime(chunk_path, (0, 0))
+
+        self.assertEqual(storage.write_chunk('INSERT INTO "user" (id) VALUES (1);', self.cache_dir), chunk_hash)
+        self.assertEqual(os.path.getmtime(chunk_path), 0)
+
+    def test_shared_chunks_are_stored_once(self):
+
+        lookup = ['INSERT INTO "country" (id) VALUES (1);', 'INSERT INTO "country" (id) VALUES (2);']
+
+        first_path = os.path.join(self.cache_dir, 'First.dump')
+        second_path = os.path.join(self.cache_dir, 'Second.dump')
+
+        storage.write_chunked_dump(first_path, lookup + ['INSERT INTO "user" (id) VALUES (1);'])
+        storage.write_chunked_dump(second_path, lookup + ['INSERT INTO "user" (id) VALUES (2);'])
+
+        self.assertEqual(len(os.listdir(storage.get_chunks_dir(self.cache_dir))), 3)
+
+        first_manifest = storage.read_manifest(first_path)
+        second_manifest = storage.read_manifest(second_path)
+
+        self.assertEqual(first_manifest['chunks'][0], second_manifest['chunks'][0])
+        self.assertNotEqual(first_manifest['chunks'][1], second_manifest['chunks'][1])
+
+    def test_load_chunked_dump(self):
+
+        statements = ['INSERT INTO "country" (id) VALUES (1);', 'INSERT INTO "user" (id) VALUES (1);']
+
+        path = os.path.join(self.cache_dir, 'First.dump')
+
+        storage.write_chunked_dump(path, statements)
+
+        self.assertListEqual(list(storage.load_chunked_dump(path)), statements)
+
+    def test_load_chunked_dump_with_multiline_values(self):
+
+        statements = [
+            'INSERT INTO "note" (id, text) VALUES (1, \'first\nsecond\');',
+            'INSERT INTO "note" (id, text) VALUES (2, \'\n\');',
+        ]
+
+        path = os.path.join(self.cache_dir, 'First.dump')
+
+        storage.write_chunked_dump(path, statements)
+
+        self.assertListEqual(list(storage.load_chunked_dump(path)), statements)
+
+    def test_load_chunked_dump_of_given_tables(self):
+
+        path = os.path.join(self.cache_dir, 'First.dump')
+
+        storage.write_chunked_dump(path, ['INSERT INTO "country" (id) VALUES (1);', 'INSERT INTO "user" (id) VALUES (1);'])
+
+        self.assertListEqual(
+            list(storage.load_chunked_dump(path, tables={'user'})), ['INSERT INTO "user" (id) VALUES (1);']
+        )
+
+    def test_chunks_are_read_once(self):
+
+        path = os.path.join(self.cache_dir, 'First.dump')
+
+        storage.write_chunked_dump(path, ['INSERT INTO "country" (id) VALUES (1);'])
+
+        list(storage.load_chunked_dump(path))
+
+        chunk_hash = storage.read_manifest(path)['chunks'][0][1]
+
+        with mock.patch('sqlalchemy_test_cache.storage.open', create=True) as open_patched:
+            statements = storage.load_chunk(chunk_hash, self.cache_dir)
+
+        self.assertListEqual(statements, ['INSERT INTO "country" (id) VALUES (1);'])
+
+        self.assertFalse(open_patched.called)
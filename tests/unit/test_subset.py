@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_subset
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.subset` module.
+"""
+from __future__ import unicode_literals
+
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from sqlalchemy_test_cache import subset
+
+
+class FetchSubsetTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        metadata = sa.MetaData()
+
+        self.country = sa.Table('country', metadata, sa.Column('id', sa.Integer, primary_key=True))
+        self.user = sa.Table(
+            'user', metadata, sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('country_id', sa.ForeignKey('country.id')), sa.Column('manager_id', sa.ForeignKey('user.id')),
+        )
+        self.address = sa.Table(
+            'address', metadata, sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('user_id', sa.ForeignKey('user.id')), sa.Column('country_id', sa.ForeignKey('country.id')),
+        )
+
+        self.tables = metadata.sorted_tables
+
+        engine = sa.create_engine('sqlite://')
+        metadata.create_all(engine)
+
+        self.dbsession = Session(bind=engine)
+        self.addCleanup(self.dbsession.close)
+
+        self.dbsession.execute(self.country.insert(), [{'id': id_} for id_ in range(1, 101)])
+        # A chain of managers: 10 is managed by 9, which is managed by 8, and so on.
+        self.dbsession.execute(self.user.insert(), [
+            {'id': id_, 'country_id': id_ * 10, 'manager_id': id_ - 1 or None} for id_ in range(1, 11)
+        ])
+        self.dbsession.execute(self.address.insert(), [
+            {'id': 1, 'user_id': 10, 'country_id': 55}, {'id': 2, 'user_id': 3, 'country_id': None},
+        ])
+
+    def query(self, table):
+        return self.dbsession.query(table).order_by(table.c.id)
+
+    def get_ids(self, rows_by_table, table):
+        return sorted(row[0] for row in rows_by_table[table.name])
+
+    def test_limit_with_referenced_rows(self):
+
+        rows_by_table = subset.fetch_subset(self.query, self.tables, {'country': 2})
+
+        self.assertListEqual(self.get_ids(rows_by_table, self.user), list(range(1, 11)))
+        self.assertListEqual(self.get_ids(rows_by_table, self.address), [1, 2])
+        self.assertListEqual(self.get_ids(rows_by_table, self.country), [1, 2, 10, 20, 30, 40, 50, 55, 60, 70, 80, 90, 100])
+
+    def test_predicate_with_self_references(self):
+
+        rows_by_table = subset.fetch_subset(self.query, self.tables, {
+            'address': lambda table: table.c.id == 1, 'user': self.user.c.id == 1, 'country': 0,
+        })
+
+        self.assertListEqual(self.get_ids(rows_by_table, self.address), [1])
+        # The user of the address, along with its managers.
+        self.assertListEqual(self.get_ids(rows_by_table, self.user), list(range(1, 11)))
+        self.assertListEqual(self.get_ids(rows_by_table, self.country), [10, 20, 30, 40, 50, 55, 60, 70, 80, 90, 100])
+
+    def test_rows_sorted_by_the_order_column(self):
+
+        rows_by_table = subset.fetch_subset(
+            self.query, self.tables, {'user': 1, 'address': 1}, lambda table: table.c.id
+        )
+
+        self.assertListEqual([row[0] for row in rows_by_table['user']], list(range(1, 11)))
+
+    def test_referenced_rows_fetched_in_chunks(self):
+
+        with mock.patch.object(subset, 'IN_CHUNK_SIZE', 3):
+            rows_by_table = subset.fetch_subset(self.query, self.tables, {'country': 0})
+
+        self.assertEqual(len(rows_by_table['country']), 11)
+
+    def test_unknown_table(self):
+        with self.assertRaises(ValueError):
+            subset.fetch_subset(self.query, self.tables, {'unknown': 1})
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_tracking
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.tracking` module.
+"""
+from __future__ import unicode_literals
+
+import unittest
+
+import sqlalchemy as sa
+
+from sqlalchemy_test_cache.tracking import TableAccessRecorder, generate_table_regex
+
+
+class GenerateTableRegexTestCase(unittest.TestCase):
+
+    def test_match_whole_identifiers(self):
+
+        regex = generate_table_regex(['user', 'user_role'])
+
+        self.assertListEqual(
+            regex.findall('SELECT "user".id FROM "user" JOIN user_role ON user_role.user_id = "user".id'),
+            ['user', 'user', 'user_role', 'user_role', 'user']
+        )
+        self.assertListEqual(regex.findall('SELECT superuser FROM users'), [])
+
+
+class TableAccessRecorderTestCase(unittest.TestCase):
+
+    def test_record_accessed_tables(self):
+
+        metadata = sa.MetaData()
+        user = sa.Table('user', metadata, sa.Column('id', sa.Integer, primary_key=True))
+        address = sa.Table('address', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+        engine = sa.create_engine('sqlite://')
+        metadata.create_all(engine)
+
+        with TableAccessRecorder([user, address], engine) as recorder:
+            with engine.connect() as connection:
+                connection.execute(sa.select(user.c.id))
+
+        with engine.connect() as connection:
+            connection.execute(sa.select(address.c.id))
+
+        self.assertSetEqual(recorder.accessed_tables, {'user'})
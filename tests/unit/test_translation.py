@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_translation
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.translation` module.
+"""
+from __future__ import unicode_literals
+
+import collections
+import unittest
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from sqlalchemy_test_cache import translation
+from sqlalchemy_test_cache.sqlalchemy_test_cache import DumpManager
+
+
+FakeBaseModel = collections.namedtuple('FakeBaseModel', 'metadata')
+
+
+def create_column(type_):
+    return sa.Table('user', sa.MetaData(), sa.Column('value', type_)).columns.value
+
+
+class GetBindTypeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dialect = sqlite.dialect()
+
+    def test_type_with_an_equivalent(self):
+        self.assertIsNone(translation.get_bind_type(create_column(sa.Integer), self.dialect))
+        self.assertIsNone(translation.get_bind_type(create_column(postgresql.JSONB), self.dialect))
+
+    def test_type_mapped_by_variant(self):
+        column = create_column(postgresql.ARRAY(sa.Integer).with_variant(sa.JSON(), 'sqlite'))
+        self.assertIsNone(translation.get_bind_type(column, self.dialect))
+
+    def test_json_type_mapped_to_text(self):
+        column = create_column(postgresql.ARRAY(sa.Integer).with_variant(sa.Text(), 'sqlite'))
+        self.assertIsInstance(translation.get_bind_type(column, self.dialect), sa.JSON)
+
+    def test_fallback_type(self):
+        self.assertIsInstance(translation.get_bind_type(create_column(postgresql.ARRAY(sa.Integer)), self.dialect), sa.JSON)
+        self.assertIsInstance(translation.get_bind_type(create_column(postgresql.INET), self.dialect), sa.String)
+
+    def test_type_without_an_equivalent(self):
+
+        with self.assertRaises(translation.DialectTranslationError) as cm:
+            translation.get_bind_type(create_column(postgresql.INT4RANGE), self.dialect)
+
+        self.assertIn("The column 'value' of the table 'user'", str(cm.exception))
+        self.assertIn('no equivalent on sqlite', str(cm.exception))
+
+
+class TranslatedRestoreTestCase(unittest.TestCase):
+
+    def test_restore_rows_dumped_on_postgresql(self):
+
+        metadata = sa.MetaData()
+        table = sa.Table(
+            'user', metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('tags', postgresql.ARRAY(sa.String).with_variant(sa.Text(), 'sqlite')),
+            sa.Column('address', postgresql.INET),
+            sa.Column('data', postgresql.JSONB),
+        )
+
+        # The schema of the tests on SQLite, where the columns without an equivalent are mapped otherwise.
+        sqlite_metadata = sa.MetaData()
+        sa.Table(
+            'user', sqlite_metadata,
+            sa.Column('id', sa.Integer, primary_key=True), sa.Column('tags', sa.Text), sa.Column('address', sa.String),
+            sa.Column('data', sa.JSON),
+        )
+
+        engine = sa.create_engine('sqlite://')
+        sqlite_metadata.create_all(engine)
+
+        dbsession = Session(bind=engine)
+        self.addCleanup(dbsession.close)
+
+        DumpManager(FakeBaseModel(metadata), dbsession).loads_columnar([('user', ['id', 'tags', 'address', 'data'], [
+            (1, ['a', 'b'], '10.0.0.1', {'key': [1, 2]}),
+            (2, None, None, None),
+        ])], translate=True)
+
+        self.assertListEqual(dbsession.execute(sa.select(table).order_by(table.c.id)).fetchall(), [
+            (1, '["a", "b"]', '10.0.0.1', {'key': [1, 2]}),
+            (2, None, None, None),
+        ])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_tuning
+----------------------------------
+
+Tests for `sqlalchemy_test_cache.tuning` module.
+"""
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:  # python2
+    import mock
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from sqlalchemy_test_cache import tuning
+
+
+def create_dbsession(dialect_name, values=()):
+
+    dbsession = mock.Mock()
+    connection = dbsession.connection.return_value
+    connection.dialect.name = dialect_name
+    connection.dialect.identifier_preparer.quote.side_effect = lambda name: '"{}"'.format(name)
+    connection.exec_driver_sql.return_value.scalar.side_effect = list(values)
+
+    return dbsession
+
+
+class RestoreTuningTestCase(unittest.TestCase):
+
+    def test_postgresql_profile(self):
+
+        dbsession = create_dbsession('postgresql', ['on'])
+
+        with tuning.RestoreTuning(dbsession):
+            pass
+
+        self.assertListEqual(dbsession.connection.return_value.exec_driver_sql.call_args_list, [
+            mock.call('SHOW synchronous_commit'),
+            mock.call("SET LOCAL synchronous_commit = 'off'"),
+            mock.call("SET LOCAL synchronous_commit = 'on'"),
+        ])
+
+    def test_given_settings(self):
+
+        dbsession = create_dbsession('mysql', [1, 1])
+
+        with tuning.RestoreTuning(dbsession, [('unique_checks', 0), ('foreign_key_checks', 0)]):
+            pass
+
+        self.assertListEqual(dbsession.connection.return_value.exec_driver_sql.call_args_list, [
+            mock.call('SELECT @@SESSION.unique_checks'),
+            mock.call('SET SESSION unique_checks = 0'),
+            mock.call('SELECT @@SESSION.foreign_key_checks'),
+            mock.call('SET SESSION foreign_key_checks = 0'),
+            mock.call('SET SESSION foreign_key_checks = 1'),
+            mock.call('SET SESSION unique_checks = 1'),
+        ])
+
+    def test_unsupported_dialect(self):
+
+        dbsession = create_dbsession('oracle')
+
+        with tuning.RestoreTuning(dbsession):
+            pass
+
+        self.assertFalse(dbsession.connection.return_value.exec_driver_sql.called)
+
+
+class SQLiteRestoreTuningTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+
+        self.engine = sa.create_engine('sqlite:///{}'.format(os.path.join(tmp_dir, 'test.db')))
+        self.addCleanup(self.engine.dispose)
+
+        self.table = sa.Table('user', sa.MetaData(), sa.Column('id', sa.Integer, primary_key=True))
+        self.table.metadata.create_all(self.engine)
+
+    def get_pragmas(self, dbsession):
+
+        connection = dbsession.connection()
+
+        return (
+            connection.exec_driver_sql('PRAGMA synchronous').scalar(),
+            connection.exec_driver_sql('PRAGMA journal_mode').scalar(),
+        )
+
+    def test_pragmas_set_back_when_the_connection_is_returned(self):
+
+        dbsession = Session(bind=self.engine)
+        previous = self.get_pragmas(dbsession)
+
+        with tuning.RestoreTuning(dbsession):
+            self.assertEqual(self.get_pragmas(dbsession), (0, 'memory'))
+            dbsession.execute(self.table.insert(), [{'id': 1}])
+
+        # Still inside the transaction of the restore.
+        self.assertEqual(self.get_pragmas(dbsession), (0, 'memory'))
+
+        dbsession.close()
+
+        dbsession = Session(bind=self.engine)
+        self.addCleanup(dbsession.close)
+
+        self.assertEqual(self.get_pragmas(dbsession), previous)
+
+    def test_not_tuned_inside_a_transaction(self):
+
+        dbsession = Session(bind=self.engine)
+        self.addCleanup(dbsession.close)
+
+        dbsession.execute(self.table.insert(), [{'id': 1}])
+        previous = self.get_pragmas(dbsession)
+
+        with tuning.RestoreTuning(dbsession):
+            self.assertEqual(self.get_pragmas(dbsession), previous)
+
+
+class AnalyzeTablesTestCase(unittest.TestCase):
+
+    def test_analyze_tables(self):
+
+        dbsession = create_dbsession('postgresql')
+
+        tuning.analyze_tables(dbsession, ['user', 'address'])
+
+        dbsession.connection.return_value.exec_driver_sql.assert_has_calls([
+            mock.call('ANALYZE "user"'), mock.call('ANALYZE "address"')
+        ])
+
+    def test_tables_not_analyzed_on_mysql(self):
+
+        dbsession = create_dbsession('mysql')
+
+        tuning.analyze_tables(dbsession, ['user'])
+
+        self.assertFalse(dbsession.connection.return_value.exec_driver_sql.called)
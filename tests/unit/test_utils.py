@@ -11,13 +11,14 @@ from __future__ import unicode_literals
 
 import collections
 import contextlib
+import io
 import os
 import tempfile
 import unittest
 try:
     from unittest import mock
 except ImportError:  # python2
-    import mock  # noqa
+    import mock
 
 from sqlalchemy_test_cache import utils
 
@@ -94,6 +95,142 @@ class GenerateDumpPathTestCase(unittest.TestCase):
         self.assertEqual(dump_path, '/foobar/ClassName-123456789.dump')
 
 
+class GenerateClassKeyTestCase(unittest.TestCase):
+
+    def test_key_is_stable_for_the_same_class_location(self):
+
+        first_class = type(str('ClassName'), (object,), {})
+        second_class = type(str('ClassName'), (object,), {})
+
+        self.assertEqual(utils.generate_class_key(first_class), utils.generate_class_key(second_class))
+
+    def test_key_changes_with_the_class_name(self):
+
+        first_class = type(str('ClassName'), (object,), {})
+        second_class = type(str('OtherClassName'), (object,), {})
+
+        self.assertNotEqual(utils.generate_class_key(first_class), utils.generate_class_key(second_class))
+
+
+class GetCacheDirTestCase(unittest.TestCase):
+
+    def test_default_cache_dir(self):
+
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(utils.get_cache_dir(), tempfile.gettempdir())
+
+    def test_cache_dir_from_environment(self):
+
+        with mock.patch.dict(os.environ, {utils.CACHE_DIR_ENV_VAR: '/foobar'}):
+            self.assertEqual(utils.get_cache_dir(), '/foobar')
+            self.assertEqual(utils.generate_dump_path('ClassName', 123456789), '/foobar/ClassName-123456789.dump')
+
+
+class DumpMetadataTestCase(unittest.TestCase):
+
+    def test_read_missing_metadata(self):
+
+        self.assertEqual(utils.read_dump_metadata('/foobarbleh.dump'), {})
+
+    def test_write_and_read_metadata(self):
+
+        dump_file_path = tempfile.NamedTemporaryFile().name
+
+        try:
+            utils.write_dump_metadata(dump_file_path, {'hits': 1, 'checksum': 'abc'})
+
+            self.assertTrue(os.path.exists(utils.generate_metadata_path(dump_file_path)))
+            self.assertEqual(utils.read_dump_metadata(dump_file_path), {'hits': 1, 'checksum': 'abc'})
+        finally:
+            os.unlink(utils.generate_metadata_path(dump_file_path))
+
+
+class GetStatementTableTestCase(unittest.TestCase):
+
+    def test_insert_statement(self):
+        self.assertEqual(utils.get_statement_table('INSERT INTO "user" (id) VALUES (1);'), 'user')
+
+    def test_other_statement(self):
+        self.assertIsNone(utils.get_statement_table('DELETE FROM "user";'))
+
+
+class GenerateTestKeyTestCase(unittest.TestCase):
+
+    def test_key_by_method(self):
+
+        klass = type(str('FakeTestCase'), (object,), {})
+
+        self.assertEqual(utils.generate_test_key(klass, 'test_first'), utils.generate_test_key(klass, 'test_first'))
+        self.assertNotEqual(utils.generate_test_key(klass, 'test_first'), utils.generate_test_key(klass, 'test_second'))
+
+    def test_key_by_arguments(self):
+
+        klass = type(str('FakeTestCase'), (object,), {})
+
+        self.assertNotEqual(
+            utils.generate_test_key(klass, 'test_fake', utils.generate_arguments_key((1,), {})),
+            utils.generate_test_key(klass, 'test_fake', utils.generate_arguments_key((2,), {}))
+        )
+
+
+class GenerateArgumentsKeyTestCase(unittest.TestCase):
+
+    def test_same_arguments(self):
+        self.assertEqual(
+            utils.generate_arguments_key((1, 'a'), {'first': [1, 2], 'second': {'b', 'a'}}),
+            utils.generate_arguments_key((1, 'a'), {'second': {'a', 'b'}, 'first': [1, 2]})
+        )
+
+    def test_different_arguments(self):
+        self.assertNotEqual(utils.generate_arguments_key((1,), {}), utils.generate_arguments_key(('1',), {}))
+        self.assertNotEqual(utils.generate_arguments_key(([1],), {}), utils.generate_arguments_key(((1,),), {}))
+        self.assertNotEqual(utils.generate_arguments_key((1,), {}), utils.generate_arguments_key((), {'x': 1}))
+
+    def test_arguments_represented_by_their_address(self):
+        self.assertIsNone(utils.generate_arguments_key((object(),), {}))
+
+
+class IterStatementsTestCase(unittest.TestCase):
+
+    def test_statements_by_line(self):
+
+        content = io.StringIO('INSERT INTO "user" (id) VALUES (1);\nINSERT INTO "user" (id) VALUES (2);\n')
+
+        self.assertListEqual(list(utils.iter_statements(content)), [
+            'INSERT INTO "user" (id) VALUES (1);', 'INSERT INTO "user" (id) VALUES (2);'
+        ])
+
+    def test_quoted_newlines_and_semicolons(self):
+
+        statements = [
+            'INSERT INTO "note" (id, text) VALUES (1, \'first;\nsecond\n\');',
+            'INSERT INTO "note" (id, text) VALUES (2, \'it\'\'s;\');',
+            'INSERT INTO "semi;colon" ("a""b;") VALUES (\'\');',
+        ]
+
+        self.assertListEqual(list(utils.iter_statements(io.StringIO('\n'.join(statements)))), statements)
+
+    def test_statements_across_blocks(self):
+
+        statements = [
+            'INSERT INTO "note" (id, text) VALUES (1, \'a;\nb\');',
+            'INSERT INTO "note" (id, text) VALUES (2, \'\'\'\');',
+        ]
+
+        for block_size in (1, 3, 7, 1024):
+            self.assertListEqual(
+                list(utils.iter_statements(io.StringIO('\n'.join(statements)), block_size)), statements
+            )
+
+    def test_text_after_the_last_statement(self):
+
+        content = io.StringIO('INSERT INTO "user" (id) VALUES (1);\nINSERT INTO \'unterminated;\n')
+
+        self.assertListEqual(list(utils.iter_statements(content)), [
+            'INSERT INTO "user" (id) VALUES (1);', '\nINSERT INTO \'unterminated;\n'
+        ])
+
+
 class LoadDumpDataFromFileTestCase(unittest.TestCase):
 
     def test_exception_when_dump_file_path_does_not_exists(self):
@@ -115,6 +252,18 @@ class LoadDumpDataFromFileTestCase(unittest.TestCase):
 
             self.assertListEqual(['INSERT INTO...\n'], dump_data)
 
+    def test_load_multiline_statements(self):
+
+        content = 'INSERT INTO "note" (text) VALUES (\'a\nb\');\nINSERT INTO "note" (text) VALUES (\'c\');\n'
+
+        with create_tmp_file(content=content, name='ClassName-123456789.dump'):
+
+            dump_data = list(utils.load_dump_data_from_file('/tmp/ClassName-123456789.dump'))
+
+            self.assertListEqual(
+                ['INSERT INTO "note" (text) VALUES (\'a\nb\');', 'INSERT INTO "note" (text) VALUES (\'c\');'], dump_data
+            )
+
 
 class WriteDumpToFileTestCase(unittest.TestCase):
 